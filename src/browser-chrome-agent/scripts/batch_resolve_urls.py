@@ -4,6 +4,34 @@
 使用方式:
     python3 batch_resolve_urls.py --config config.json
     python3 batch_resolve_urls.py --urls urls.txt --output result.md
+    python3 batch_resolve_urls.py --urls urls.txt --concurrency 16 --per-host 2 --delay 0.3
+    cat urls.jsonl | python3 batch_resolve_urls.py --urls - --output result.jsonl
+
+并发解析：总并发数由 --concurrency 限制；同一主机同时最多 --per-host 个请求，
+且相邻两次请求的发起间隔不小于 delay 秒，避免压垮跳转站点。输出顺序与输入一致。
+
+流式处理：--urls 文件（- 表示标准输入）逐行读取，结果按输入顺序逐条写入输出文件，
+运行中途输出文件即可使用；内存占用与输入长度无关。输出格式由 --format 指定
+（md / csv / jsonl），默认按输出文件扩展名推断。
+链接先规范化（协议和主机小写、去掉默认端口和 #片段）再去重，重复的跳转链接只解析一次：
+正在解析的重复链接共用同一个请求，已完成的从缓存（--no-cache 时从最近结果的内存 LRU）取。
+
+结果缓存：每个链接解析完成即写入 SQLite 缓存（默认 <output>.cache.sqlite），
+键为跳转链接 + 提取规则的哈希。再次运行时有效期内的结果直接复用：
+成功结果默认保留 --cache-ttl 小时，失败结果保留 --negative-ttl 小时后重试。
+中断后加 --resume 重新运行，已成功解析的链接不论是否过期都跳过，请求失败的链接重新请求。
+    python3 batch_resolve_urls.py --urls urls.txt --output result.md --resume
+    python3 batch_resolve_urls.py --urls urls.txt --no-cache
+
+页面内容流式读取：所有提取规则合并为一个正则逐块匹配，取页面中最早出现的链接，
+找到即断开连接；未找到时最多读取 --max-bytes 字节。
+
+多跳解析：从跳转链接出发，依次跟随 HTTP 重定向、meta refresh 和页面脚本中的链接，
+直到离开跳转站点或达到 --max-hops 跳，每一跳都会记录。跳转站点默认为每个链接自己的主机，
+跳转经过多个站点时用 --jump-host 指定（可重复，含子域名）。
+HTTP 重定向之后的一跳先发 HEAD 请求，仍是重定向时无需下载页面（--no-head 关闭）。
+同一主机的并发数和请求间隔按每个请求（HEAD、GET、每一跳）计算。
+所有请求共用一个连接池（保持连接），连接错误和 429/5xx 响应按指数退避重试 --retries 次。
 
 配置文件格式 (config.json):
     {
@@ -17,26 +45,84 @@
             "window\\.location\\s*=\\s*[\"'](https?://[^\"']+)"
         ],
         "delay": 0.3,
+        "concurrency": 8,
+        "per_host": 2,
+        "cache": "output.md.cache.sqlite",
+        "cache_ttl": 24,
+        "negative_ttl": 1,
+        "max_bytes": 1048576,
+        "max_hops": 5,
+        "retries": 2,
+        "head": true,
+        "jump_hosts": ["example.com"],
         "title": "网站链接汇总",
         "description": "来源说明"
     }
 
-URL文件格式 (urls.txt，每行一个，名称和URL用制表符或 | 分隔):
+URL文件格式 (urls.txt，每行一个，名称和URL用制表符或 | 分隔，也可以只有 URL):
     Web of Science | https://example.com/jump/wos
     Nature | https://example.com/jump/nature
+
+也可以是 JSONL，每行一个对象（name 可省略）:
+    {"name": "Nature", "url": "https://example.com/jump/nature"}
 """
 import argparse
+import codecs
+import csv
+import hashlib
 import json
 import re
+import sqlite3
 import sys
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
 }
 
+DEFAULT_DELAY = 0.3
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PER_HOST = 2
+# 缓存有效期（小时）：成功结果 / 失败结果
+DEFAULT_CACHE_TTL = 24
+DEFAULT_NEGATIVE_TTL = 1
+
+# 响应体最多读取的字节数，找到链接后提前结束
+DEFAULT_MAX_BYTES = 1024 * 1024
+CHUNK_SIZE = 16 * 1024
+# 相邻块之间保留的重叠字符数，应大于单个匹配的长度
+SCAN_OVERLAP = 4096
+
+# 单个链接最多跟随的跳数（HTTP 重定向、meta refresh、页面脚本各算一跳）
+DEFAULT_MAX_HOPS = 5
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+REQUEST_TIMEOUT = 15
+
+# 同时在途（已提交未输出）的链接数 = 并发数 × WINDOW_FACTOR
+WINDOW_FACTOR = 4
+# 不使用缓存时，内存中保留最近多少个结果用于去重
+DEFAULT_MEMO_SIZE = 100_000
+# 按主机限流时最多记录的主机数，超出后淘汰最久未用且空闲的主机
+DEFAULT_MAX_HOSTS = 10_000
+OUTPUT_FORMATS = ("md", "csv", "jsonl")
+
+NOT_FOUND = "未找到真实链接"
+# 请求失败（网络错误、HTTP 错误状态）的结果前缀，可能是暂时性的
+REQUEST_FAILED = "请求失败"
+
 # 默认提取模式：覆盖常见的前端跳转方式
 DEFAULT_PATTERNS = [
     r"goToLink\(\d+,\s*'(https?://[^']+)'",
@@ -46,29 +132,464 @@ DEFAULT_PATTERNS = [
     r'data-url=["\']?(https?://[^"\'>\s]+)',
 ]
 
+# 编号反向引用（\1）和命名反向引用在合并后的正则中含义会变
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class PatternMatcher:
+    """把多条提取规则合并成一个正则，一次扫描找出最早出现的匹配
 
-def resolve_url(name, jump_url, patterns, base_domain=None):
-    """请求跳转页面，通过正则提取真实URL"""
+    每条规则取第 1 个捕获组作为 URL。规则含编号反向引用或合并后无法编译
+    （如命名组重名）时，改为逐条搜索并取位置最早的匹配。
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._compiled = [re.compile(p, re.IGNORECASE) for p in self.patterns]
+        for pattern, compiled in zip(self.patterns, self._compiled):
+            if not compiled.groups:
+                raise ValueError(f"提取规则缺少捕获组: {pattern}")
+        self._combined = None
+        if not any(_BACKREF_RE.search(p) for p in self.patterns):
+            try:
+                self._combined = re.compile("|".join(f"(?:{p})" for p in self.patterns), re.IGNORECASE)
+            except re.error:
+                pass
+        # 各规则第 1 个捕获组在合并正则中的编号
+        self._groups = []
+        index = 1
+        for compiled in self._compiled:
+            self._groups.append(index)
+            index += compiled.groups
+
+    def search(self, text):
+        """返回 (URL, 匹配起点, 匹配终点)，没有匹配时返回 None"""
+        if self._combined is not None:
+            match = self._combined.search(text)
+            if match is None:
+                return None
+            url = next((match.group(g) for g in self._groups if match.group(g) is not None), None)
+            return url, match.start(), match.end()
+        best = None
+        for compiled in self._compiled:
+            match = compiled.search(text)
+            if match and (best is None or match.start() < best.start()):
+                best = match
+        return (best.group(1), best.start(), best.end()) if best else None
+
+
+def _hop_via(text):
+    """页面中匹配到的链接属于哪种跳转"""
+    return "meta" if "<meta" in text.lower() else "js"
+
+
+def scan_body(resp, matcher, max_bytes=DEFAULT_MAX_BYTES):
+    """分块读取响应体并匹配，找到即停止，最多读取 max_bytes 字节（0 表示不限）
+
+    块之间保留 SCAN_OVERLAP 个字符的重叠，跨块的匹配不会漏掉；
+    匹配延伸到缓冲区末尾时（URL 可能还没读完）继续读下一块再确认。
+
+    Returns:
+        (URL, 跳转方式 meta/js)，没有匹配时返回 None
+    """
     try:
-        resp = requests.get(jump_url, allow_redirects=True, timeout=15, headers=HEADERS)
-
-        # 如果 HTTP 重定向到了外部域名，直接返回
-        if base_domain and base_domain not in resp.url:
-            return resp.url
-
-        # 从页面内容中用正则提取
-        for pattern in patterns:
-            match = re.search(pattern, resp.text, re.IGNORECASE)
-            if match:
-                url = match.group(1)
-                if base_domain and base_domain not in url:
-                    return url
-                # 即使包含 base_domain 也返回（可能就是目标）
-                return url
-
-        return "未找到真实链接"
+        decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    read = 0
+    for chunk in resp.iter_content(CHUNK_SIZE):
+        if max_bytes:
+            chunk = chunk[:max_bytes - read]
+        read += len(chunk)
+        buffer += decoder.decode(chunk)
+        found = matcher.search(buffer)
+        if found and found[2] < len(buffer):
+            return found[0], _hop_via(buffer[found[1]:found[2]])
+        buffer = buffer[found[1] if found else max(0, len(buffer) - SCAN_OVERLAP):]
+        if max_bytes and read >= max_bytes:
+            break
+    buffer += decoder.decode(b"", final=True)
+    found = matcher.search(buffer)
+    return (found[0], _hop_via(buffer[found[1]:found[2]])) if found else None
+
+
+def make_session(pool_size=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+    """创建共享的 HTTP 会话：连接池保持连接，连接错误和 429/5xx 按指数退避重试
+
+    Args:
+        pool_size: 每个主机保持的最大连接数，一般取总并发数
+        retries: 最大重试次数
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"HEAD", "GET"}),
+        # 重试用尽后返回最后一次响应，由调用方处理状态码
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=max(10, pool_size), pool_maxsize=max(1, pool_size), max_retries=retry)
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def host_set(jump_hosts):
+    """跳转站点主机集合（小写），jump_hosts 可以是单个主机字符串或主机列表，为空时返回 None"""
+    if not jump_hosts:
+        return None
+    if isinstance(jump_hosts, str):
+        jump_hosts = [jump_hosts]
+    return frozenset(host.lower() for host in jump_hosts)
+
+
+def on_hosts(url, hosts):
+    """url 的主机是否属于 hosts（含子域名）"""
+    netloc = urlparse(url).netloc.lower()
+    return any(netloc == host or netloc.endswith("." + host) for host in hosts)
+
+
+def next_hop(http, url, matcher, max_bytes=DEFAULT_MAX_BYTES, head=False, limiter=None):
+    """请求一次 url，返回下一跳 (URL, 跳转方式 http/meta/js)，页面中没有链接时返回 None
+
+    head 为 True 时先发 HEAD：是重定向则直接得到下一跳，不下载页面；
+    不是重定向（或服务器不支持 HEAD）时再用 GET 流式扫描页面。
+    指定 limiter（HostLimiter）时每个请求各占一个主机名额。
+    """
+    def slot():
+        return limiter.slot(url) if limiter is not None else nullcontext()
+
+    if head:
+        with slot():
+            resp = http.head(url, allow_redirects=False, timeout=REQUEST_TIMEOUT)
+            resp.close()
+        if resp.is_redirect:
+            return urljoin(url, resp.headers["location"]), "http"
+        if resp.status_code in RETRY_STATUSES:
+            # 已按重试策略重试过，不再用 GET 重复一遍
+            resp.raise_for_status()
+    with slot(), http.get(url, allow_redirects=False, timeout=REQUEST_TIMEOUT, stream=True) as resp:
+        if resp.is_redirect:
+            return urljoin(url, resp.headers["location"]), "http"
+        resp.raise_for_status()
+        found = scan_body(resp, matcher, max_bytes)
+    if found is None:
+        return None
+    return urljoin(url, found[0]), found[1]
+
+
+def resolve_chain(jump_url, patterns, jump_hosts=None, max_bytes=DEFAULT_MAX_BYTES, session=None,
+                  max_hops=DEFAULT_MAX_HOPS, head=True, limiter=None):
+    """从跳转链接出发逐跳解析，直到离开跳转站点
+
+    只扫描跳转站点上的页面；下一跳离开 jump_hosts、出现循环或达到 max_hops 跳时，
+    以当前链接为结果。跳转站点上的页面没有下一跳时：第一个页面返回 NOT_FOUND，
+    之后的页面本身即为结果（可能就是目标）。
+
+    Args:
+        jump_hosts: 跳转站点主机（字符串或集合），默认为 jump_url 的主机
+        session: 共享会话（make_session），默认不复用连接
+        head: 上一跳是 HTTP 重定向时，下一跳先发 HEAD（跳转页面本身通常要 GET 扫描，不发 HEAD）
+        limiter: 按主机限流（HostLimiter），每个请求各占一个名额
+
+    Returns:
+        (结果, [(跳转方式, URL), ...])，请求失败时结果为 "请求失败: ..."（REQUEST_FAILED）
+    """
+    matcher = patterns if isinstance(patterns, PatternMatcher) else PatternMatcher(patterns)
+    http = session or requests
+    url = jump_url
+    hops = []
+    visited = set()
+    try:
+        parts = urlparse(jump_url)
+        if parts.scheme.lower() not in ("http", "https") or not parts.netloc:
+            return invalid_url(jump_url, "缺少 http(s) 协议或主机"), hops
+        hosts = host_set(jump_hosts) or {parts.netloc.lower()}
+        while on_hosts(url, hosts) and len(hops) < max_hops and url not in visited:
+            visited.add(url)
+            after_redirect = bool(hops) and hops[-1][0] == "http"
+            hop = next_hop(http, url, matcher, max_bytes, head and after_redirect, limiter)
+            if hop is None:
+                return (url if hops else NOT_FOUND), hops
+            hops.append((hop[1], hop[0]))
+            url = hop[0]
+        return url, hops
     except Exception as e:
-        return f"请求失败: {e}"
+        return f"{REQUEST_FAILED}: {e}", hops
+
+
+def invalid_url(url, reason):
+    """无法解析的链接的结果说明"""
+    return f"{REQUEST_FAILED}: Invalid URL {url!r}: {reason}"
+
+
+def resolve_url(name, jump_url, patterns, jump_hosts=None, max_bytes=DEFAULT_MAX_BYTES, session=None,
+                max_hops=DEFAULT_MAX_HOPS, head=True):
+    """请求跳转页面，返回真实URL（或失败说明），参数见 resolve_chain
+
+    jump_hosts 兼容旧的 base_domain 参数，可传单个主机字符串。
+    """
+    return resolve_chain(jump_url, patterns, jump_hosts, max_bytes, session, max_hops, head)[0]
+
+
+def is_resolved(result):
+    """resolve_url 的返回值是否为解析成功的链接（失败时返回的是说明文字）"""
+    return result.startswith(("http://", "https://"))
+
+
+def canonical_url(url):
+    """规范化链接用于去重：协议和主机小写，去掉默认端口和 #片段，空路径补 /
+
+    url 不是字符串或无法解析（如 http://[oops）时抛出 ValueError。
+    """
+    if not isinstance(url, str):
+        raise ValueError(f"链接不是字符串: {type(url).__name__}")
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, _, port = netloc.rpartition(":")
+    if host and (scheme, port) in (("http", "80"), ("https", "443")):
+        netloc = host
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def patterns_key(patterns, max_hops=DEFAULT_MAX_HOPS, jump_hosts=None):
+    """解析规则（提取规则、最大跳数、指定的跳转站点）的哈希，规则变化后旧缓存自动失效"""
+    rule = [list(patterns), max_hops]
+    if jump_hosts:
+        rule.append(sorted(host_set(jump_hosts)))
+    raw = json.dumps(rule, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResolutionCache:
+    """SQLite 解析结果缓存，键为 (跳转链接, 提取规则哈希)
+
+    只在主线程读写；每条结果写入后立即提交，进程中断也不会丢失已完成的结果。
+
+    Args:
+        path: 数据库文件路径
+        key: 提取规则哈希（patterns_key）
+        ttl: 成功结果的有效期（秒）
+        negative_ttl: 失败结果的有效期（秒）
+    """
+
+    def __init__(self, path, key, ttl=DEFAULT_CACHE_TTL * 3600, negative_ttl=DEFAULT_NEGATIVE_TTL * 3600):
+        self.key = key
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            " url TEXT NOT NULL,"
+            " patterns TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " ok INTEGER NOT NULL,"
+            " resolved_at REAL NOT NULL,"
+            " hops TEXT NOT NULL DEFAULT '[]',"
+            " PRIMARY KEY (url, patterns))"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(resolutions)")}
+        if "hops" not in columns:
+            self._db.execute("ALTER TABLE resolutions ADD COLUMN hops TEXT NOT NULL DEFAULT '[]'")
+        self._db.commit()
+
+    def get(self, url, resume=False):
+        """返回有效的缓存结果 (结果, hops)，没有或已过期时返回 None
+
+        resume 为 True 时成功结果不受 ttl 限制，请求失败的结果（可能是暂时性的）一律重试，
+        未找到链接的结果仍按 negative_ttl 过期。
+        """
+        row = self._db.execute(
+            "SELECT result, ok, resolved_at, hops FROM resolutions WHERE url = ? AND patterns = ?",
+            (url, self.key),
+        ).fetchone()
+        if row is None:
+            return None
+        result, ok, resolved_at, hops = row
+        age = time.time() - resolved_at
+        if ok:
+            if not resume and age > self.ttl:
+                return None
+        elif age > self.negative_ttl or (resume and result.startswith(REQUEST_FAILED)):
+            return None
+        self.hits += 1
+        return result, [tuple(hop) for hop in json.loads(hops)]
+
+    def put(self, url, result, hops=()):
+        self._db.execute(
+            "INSERT OR REPLACE INTO resolutions (url, patterns, result, ok, resolved_at, hops)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (url, self.key, result, int(is_resolved(result)), time.time(), json.dumps(list(hops), ensure_ascii=False)),
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class HostLimiter:
+    """按主机限制并发请求数和请求发起间隔（线程安全）
+
+    Args:
+        max_per_host: 同一主机同时进行的最大请求数
+        delay: 同一主机相邻两次请求发起的最小间隔（秒）
+        max_hosts: 最多记录的主机数，超出后淘汰最久未用、没有请求在途且间隔已过的主机
+    """
+
+    def __init__(self, max_per_host, delay, max_hosts=DEFAULT_MAX_HOSTS):
+        self.max_per_host = max(1, max_per_host)
+        self.delay = max(0.0, delay)
+        self.max_hosts = max(1, max_hosts)
+        self._lock = threading.Lock()
+        # host -> [Semaphore, 下一次允许发起请求的时间, 占用数]，按最近使用排序
+        self._hosts = OrderedDict()
+
+    def _evict(self, now):
+        """为新主机腾出位置：从最久未用的开始淘汰空闲主机，仍在用的移到末尾（调用方持有锁）"""
+        for _ in range(len(self._hosts)):
+            if len(self._hosts) < self.max_hosts:
+                return
+            host, entry = next(iter(self._hosts.items()))
+            if entry[2] == 0 and entry[1] <= now:
+                del self._hosts[host]
+            else:
+                self._hosts.move_to_end(host)
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                self._evict(time.monotonic())
+                entry = self._hosts[host] = [threading.Semaphore(self.max_per_host), 0.0, 0]
+            else:
+                self._hosts.move_to_end(host)
+            entry[2] += 1
+        entry[0].acquire()
+        try:
+            # 预约发起时间：每个请求把下一个可用时间推后 delay 秒
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, entry[1])
+                entry[1] = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            yield
+        finally:
+            entry[0].release()
+            with self._lock:
+                entry[2] -= 1
+
+
+def resolve_stream(links, patterns, jump_hosts=None, concurrency=DEFAULT_CONCURRENCY,
+                   per_host=DEFAULT_PER_HOST, delay=DEFAULT_DELAY, cache=None, resume=False,
+                   max_bytes=DEFAULT_MAX_BYTES, max_hops=DEFAULT_MAX_HOPS, retries=DEFAULT_RETRIES, head=True,
+                   memo_size=DEFAULT_MEMO_SIZE):
+    """流式并发解析，按输入顺序逐个产出 (名称, 跳转链接, 结果, hops, 来源)
+
+    links 可以是任意可迭代对象，按需读取：最多 concurrency × WINDOW_FACTOR 个链接在途，
+    队首未完成时暂停读取，内存占用与输入长度无关。
+
+    每个请求完成即写入 cache（未指定 cache 时记入 memo_size 大小的 LRU），不等按顺序输出，
+    中断时已完成的结果不会丢失。
+
+    链接按 canonical_url 去重，来源为:
+        new    本次请求解析
+        cache  缓存命中（cache 或 LRU）
+        dup    与在途的相同链接共用同一个请求
+
+    jump_hosts 为 None 时，每个链接的跳转站点是它自己的主机；指定时对所有链接相同，
+    结果只取决于链接本身，与输入顺序无关。
+    """
+    hosts = host_set(jump_hosts)
+    limiter = HostLimiter(per_host, delay)
+    matcher = PatternMatcher(patterns)
+    session = make_session(concurrency, retries)
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    window = max(1, concurrency) * WINDOW_FACTOR
+    # 按输入顺序排队的条目: [名称, 跳转链接, 规范化链接, future 或 None, 已知结果, 来源]
+    queue = deque()
+    inflight = {}
+    memo = OrderedDict()
+    # 已完成的请求 (规范化链接, future)，由 future 回调放入，主线程取出写入缓存
+    completed = SimpleQueue()
+
+    def work(url, hosts):
+        return resolve_chain(url, matcher, hosts, max_bytes, session, max_hops, head, limiter)
+
+    def checkpoint(block=False):
+        """把已完成的请求写入缓存；block 为 True 时至少等到一个完成"""
+        while True:
+            try:
+                key, future = completed.get(block=block)
+            except Empty:
+                return
+            block = False
+            result, hops = future.result()
+            inflight.pop(key, None)
+            if cache is not None:
+                cache.put(key, result, hops)
+            else:
+                memo[key] = (result, hops)
+                if len(memo) > memo_size:
+                    memo.popitem(last=False)
+
+    def ready():
+        return queue and (queue[0][3] is None or queue[0][3].done())
+
+    def enqueue(name, url):
+        """按去重结果把链接排入队列：共用在途请求、命中缓存或提交新请求"""
+        try:
+            key = canonical_url(url)
+        except ValueError as e:
+            # 格式错误的链接记为请求失败，不中断整批
+            queue.append((name, url, None, None, (invalid_url(url, e), []), "new"))
+            return
+        if key in inflight:
+            queue.append((name, url, key, inflight[key], None, "dup"))
+            return
+        known = cache.get(key, resume) if cache is not None else memo.get(key)
+        if known is not None:
+            if cache is None:
+                memo.move_to_end(key)
+            queue.append((name, url, key, None, known, "cache"))
+            return
+        future = inflight[key] = pool.submit(work, key, hosts)
+        future.add_done_callback(lambda f: completed.put((key, f)))
+        queue.append((name, url, key, future, None, "new"))
+
+    def emit(entry):
+        name, url, key, future, known, source = entry
+        result, hops = known if future is None else future.result()
+        return name, url, result, hops, source
+
+    try:
+        for name, url in links:
+            enqueue(name, url)
+            checkpoint()
+            # 输出已完成的队首；在途已满时边写缓存边等待队首完成
+            while ready() or len(queue) >= window:
+                if ready():
+                    yield emit(queue.popleft())
+                else:
+                    checkpoint(block=True)
+        while queue:
+            if ready():
+                yield emit(queue.popleft())
+            else:
+                checkpoint(block=True)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        session.close()
+        checkpoint()
 
 
 def load_from_config(config_path):
@@ -82,50 +603,155 @@ def load_from_config(config_path):
         "links": links,
         "patterns": patterns,
         "output": config.get("output", "output.md"),
-        "delay": config.get("delay", 0.3),
+        "delay": config.get("delay", DEFAULT_DELAY),
+        "concurrency": config.get("concurrency", DEFAULT_CONCURRENCY),
+        "per_host": config.get("per_host", DEFAULT_PER_HOST),
+        "cache": config.get("cache"),
+        "cache_ttl": config.get("cache_ttl", DEFAULT_CACHE_TTL),
+        "negative_ttl": config.get("negative_ttl", DEFAULT_NEGATIVE_TTL),
+        "max_bytes": config.get("max_bytes", DEFAULT_MAX_BYTES),
+        "max_hops": config.get("max_hops", DEFAULT_MAX_HOPS),
+        "retries": config.get("retries", DEFAULT_RETRIES),
+        "head": config.get("head", True),
+        "jump_hosts": config.get("jump_hosts"),
+        "format": config.get("format"),
         "title": config.get("title", "链接汇总"),
         "description": config.get("description", ""),
     }
 
 
-def load_from_file(urls_path):
-    """从文本文件加载 URL 列表"""
-    links = []
-    with open(urls_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
+def parse_link_line(line):
+    """解析一行输入，返回 (名称, URL)，空行和注释返回 None
+
+    支持 名称 | URL、名称<Tab>URL、纯 URL，以及 JSONL 对象 {"name": ..., "url": ...}。
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        item = json.loads(line)
+        url = item["url"]
+        return item.get("name") or url, url
+    if "|" in line:
+        parts = line.split("|", 1)
+    elif "\t" in line:
+        parts = line.split("\t", 1)
+    else:
+        parts = [line, line]
+    name = parts[0].strip()
+    url = parts[1].strip() if len(parts) > 1 else name
+    return name, url
+
+
+def iter_links(urls_path):
+    """逐行读取链接列表（urls_path 为 - 时读标准输入），格式错误的行跳过并提示"""
+    f = sys.stdin if urls_path == "-" else open(urls_path, "r", encoding="utf-8")
+    try:
+        for lineno, line in enumerate(f, 1):
+            try:
+                link = parse_link_line(line)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"跳过第 {lineno} 行（格式错误: {e}）", file=sys.stderr)
                 continue
-            if "|" in line:
-                parts = line.split("|", 1)
-            elif "\t" in line:
-                parts = line.split("\t", 1)
-            else:
-                parts = [line, line]
-            name = parts[0].strip()
-            url = parts[1].strip() if len(parts) > 1 else name
-            links.append((name, url))
-    return links
+            if link is not None:
+                yield link
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def output_format(output_path, fmt=None):
+    """输出格式：显式指定的 fmt，否则按扩展名推断（.csv / .jsonl / .ndjson，其余为 md）"""
+    if fmt:
+        return fmt
+    suffix = Path(output_path).suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "md"
+
+
+class ResultWriter:
+    """逐条写入结果（Markdown 表格行 / CSV / JSONL），每行写完即刷新到文件
 
+    Args:
+        output_path: 输出文件路径
+        fmt: md / csv / jsonl
+        title, description: Markdown 文档标题和描述
+    """
 
-def write_markdown(results, output_path, title, description):
-    """将结果写入 Markdown 文件"""
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(f"# {title}\n\n")
-        if description:
-            f.write(f"> {description}\n\n")
-        f.write("| 序号 | 名称 | 链接 |\n")
-        f.write("|------|------|------|\n")
-        for i, (name, real_url) in enumerate(results, 1):
-            f.write(f"| {i} | {name} | {real_url} |\n")
+    def __init__(self, output_path, fmt="md", title="链接汇总", description=""):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        self.fmt = fmt
+        self.count = 0
+        # 行缓冲：每写完一行即落盘，运行中途文件也是完整可用的
+        self._f = open(output_path, "w", encoding="utf-8", newline="" if fmt == "csv" else None, buffering=1)
+        if fmt == "md":
+            self._f.write(f"# {title}\n\n")
+            if description:
+                self._f.write(f"> {description}\n\n")
+            self._f.write("| 序号 | 名称 | 链接 |\n")
+            self._f.write("|------|------|------|\n")
+        elif fmt == "csv":
+            self._csv = csv.writer(self._f)
+            self._csv.writerow(["index", "name", "url", "result", "ok", "hops"])
+
+    def write(self, name, url, result, hops=()):
+        self.count += 1
+        if self.fmt == "md":
+            self._f.write(f"| {self.count} | {name} | {result} |\n")
+        elif self.fmt == "csv":
+            self._csv.writerow([self.count, name, url, result, int(is_resolved(result)),
+                                " ".join(f"{via}:{hop}" for via, hop in hops)])
+        else:
+            self._f.write(json.dumps({
+                "index": self.count,
+                "name": name,
+                "url": url,
+                "result": result,
+                "ok": is_resolved(result),
+                "hops": [{"via": via, "url": hop} for via, hop in hops],
+            }, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
 def main():
     parser = argparse.ArgumentParser(description="批量解析跳转链接的真实目标URL")
     parser.add_argument("--config", help="JSON 配置文件路径")
-    parser.add_argument("--urls", help="URL 列表文件路径（每行: 名称 | URL）")
+    parser.add_argument("--urls", help="URL 列表文件路径（每行: 名称 | URL，或 JSONL），- 表示标准输入")
     parser.add_argument("--output", default="output.md", help="输出文件路径")
-    parser.add_argument("--delay", type=float, default=0.3, help="请求间隔秒数")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="输出格式（默认按输出文件扩展名推断）")
+    parser.add_argument("--delay", type=float, default=DEFAULT_DELAY, help="同一主机的请求间隔秒数")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"同时进行的最大请求数（默认 {DEFAULT_CONCURRENCY}）")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                        help=f"同一主机同时进行的最大请求数（默认 {DEFAULT_PER_HOST}）")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES,
+                        help=f"每个页面最多读取的字节数，0 表示不限（默认 {DEFAULT_MAX_BYTES}）")
+    parser.add_argument("--max-hops", type=int, default=DEFAULT_MAX_HOPS,
+                        help=f"每个链接最多跟随的跳数（默认 {DEFAULT_MAX_HOPS}）")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"连接错误和 429/5xx 响应的重试次数（默认 {DEFAULT_RETRIES}）")
+    parser.add_argument("--jump-host", action="append",
+                        help="跳转站点主机（含子域名），可重复指定；默认为每个链接自己的主机")
+    parser.add_argument("--no-head", action="store_true", help="HTTP 重定向之后也不先发 HEAD 请求，每一跳都直接 GET")
+    parser.add_argument("--cache", help="缓存数据库路径（默认 <output>.cache.sqlite）")
+    parser.add_argument("--no-cache", action="store_true", help="不读写缓存")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+                        help=f"成功结果的缓存有效期，小时（默认 {DEFAULT_CACHE_TTL}）")
+    parser.add_argument("--negative-ttl", type=float, default=DEFAULT_NEGATIVE_TTL,
+                        help=f"失败结果的缓存有效期，小时（默认 {DEFAULT_NEGATIVE_TTL}）")
+    parser.add_argument("--resume", action="store_true", help="跳过缓存中已成功解析的链接（不论是否过期），重新请求失败的链接")
     parser.add_argument("--title", default="链接汇总", help="文档标题")
     parser.add_argument("--description", default="", help="文档描述")
     args = parser.parse_args()
@@ -135,41 +761,67 @@ def main():
         links = config["links"]
         patterns = config["patterns"]
         output = args.output if args.output != "output.md" else config["output"]
-        delay = args.delay if args.delay != 0.3 else config["delay"]
+        delay = args.delay if args.delay != DEFAULT_DELAY else config["delay"]
+        concurrency = args.concurrency if args.concurrency != DEFAULT_CONCURRENCY else config["concurrency"]
+        per_host = args.per_host if args.per_host != DEFAULT_PER_HOST else config["per_host"]
+        cache_path = args.cache or config["cache"]
+        cache_ttl = args.cache_ttl if args.cache_ttl != DEFAULT_CACHE_TTL else config["cache_ttl"]
+        negative_ttl = args.negative_ttl if args.negative_ttl != DEFAULT_NEGATIVE_TTL else config["negative_ttl"]
+        max_bytes = args.max_bytes if args.max_bytes != DEFAULT_MAX_BYTES else config["max_bytes"]
+        max_hops = args.max_hops if args.max_hops != DEFAULT_MAX_HOPS else config["max_hops"]
+        retries = args.retries if args.retries != DEFAULT_RETRIES else config["retries"]
+        head = config["head"] and not args.no_head
+        jump_hosts = args.jump_host or config["jump_hosts"]
+        fmt = args.format or config["format"]
         title = args.title if args.title != "链接汇总" else config["title"]
         description = args.description or config["description"]
     elif args.urls:
-        links = load_from_file(args.urls)
+        links = iter_links(args.urls)
         patterns = DEFAULT_PATTERNS
         output = args.output
         delay = args.delay
+        concurrency = args.concurrency
+        per_host = args.per_host
+        cache_path = args.cache
+        cache_ttl = args.cache_ttl
+        negative_ttl = args.negative_ttl
+        max_bytes = args.max_bytes
+        max_hops = args.max_hops
+        retries = args.retries
+        head = not args.no_head
+        jump_hosts = args.jump_host
+        fmt = args.format
         title = args.title
         description = args.description
     else:
         print("请指定 --config 或 --urls 参数")
         sys.exit(1)
 
-    # 自动推断 base_domain（跳转页面的域名）
-    from urllib.parse import urlparse
-    domains = set()
-    for _, url in links:
-        parsed = urlparse(url)
-        if parsed.netloc:
-            domains.add(parsed.netloc)
-    base_domain = domains.pop() if len(domains) == 1 else None
-
-    results = []
-    total = len(links)
-    for i, (name, url) in enumerate(links, 1):
-        print(f"[{i}/{total}] {name} ...", end=" ", flush=True)
-        real_url = resolve_url(name, url, patterns, base_domain)
-        print(real_url)
-        results.append((name, real_url))
-        if i < total:
-            time.sleep(delay)
-
-    write_markdown(results, output, title, description)
-    print(f"\n完成！共 {len(results)} 个，已写入: {output}")
+    cache = None
+    if not args.no_cache:
+        cache = ResolutionCache(cache_path or f"{output}.cache.sqlite", patterns_key(patterns, max_hops, jump_hosts),
+                                ttl=cache_ttl * 3600, negative_ttl=negative_ttl * 3600)
+    counts = {"new": 0, "cache": 0, "dup": 0}
+    labels = {"cache": "缓存", "dup": "重复"}
+    try:
+        with ResultWriter(output, output_format(output, fmt), title, description) as writer:
+            results = resolve_stream(links, patterns, jump_hosts, concurrency, per_host, delay,
+                                     cache=cache, resume=args.resume, max_bytes=max_bytes,
+                                     max_hops=max_hops, retries=retries, head=head)
+            for name, url, real_url, hops, source in results:
+                writer.write(name, url, real_url, hops)
+                counts[source] += 1
+                notes = [" → ".join(via for via, _ in hops)] if hops else []
+                if source in labels:
+                    notes.append(labels[source])
+                note = f"（{'，'.join(notes)}）" if notes else ""
+                print(f"[{writer.count}] {name} ... {real_url}{note}", flush=True)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    print(f"\n完成！共 {writer.count} 个（解析 {counts['new']}，缓存 {counts['cache']}，重复 {counts['dup']}），"
+          f"已写入: {output}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,289 @@
+"""
+端到端基准测试
+
+启动 server.py 子进程和模拟扩展（fake_extension.py），通过 stdin/stdout JSON 协议
+驱动 TOOLS 中的每个工具，统计各工具的 p50/p95/p99 延迟、吞吐量和服务器峰值内存。
+
+用法:
+  python3 benchmark.py
+  python3 benchmark.py --iterations 50 --snapshot-lines 20000 --html-mb 5
+  python3 benchmark.py --concurrency 8 --tools find_element,get_text,xpath_query
+  python3 benchmark.py --output bench.json --server-args "--executor process"
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import argparse
+import asyncio
+import json
+import shlex
+import tempfile
+import time
+
+from fake_extension import add_extension_args, extension_from_args
+from tools import TOOLS
+
+DEFAULT_PORT = 9119
+SERVER_SCRIPT = Path(__file__).parent / "server.py"
+
+
+def bench_params(tmp_dir: Path) -> dict:
+    """每个工具的基准参数。新增工具时在此补充，未列出的工具使用空参数"""
+    return {
+        "navigate": {"url": "https://example.com/bench"},
+        "go_back": {},
+        "go_forward": {},
+        "click": {"x": 100, "y": 200},
+        "hover": {"ref": "s1e2"},
+        "type": {"ref": "s1e2", "text": "hello"},
+        "select_option": {"ref": "s1e2", "values": ["a"]},
+        "drag": {"startRef": "s1e2", "endRef": "s1e3"},
+        "press_key": {"key": "Enter"},
+        "get_coordinates": {"ref": "s1e2"},
+        "find_element": {"keyword": "Button"},
+        "find_and_locate": {"keyword": "Link"},
+        "get_text": {},
+        "wait": {"time": 0},
+        "wait_for": {"keyword": "Button"},
+        "screenshot": {"savePath": str(tmp_dir / "screenshot.png")},
+        "snapshot": {"snapshot_file": str(tmp_dir / "snapshot.txt")},
+        "get_console_logs": {},
+        "get_html": {"savePath": str(tmp_dir / "page.html")},
+        "list_tabs": {},
+        "new_tab": {"url": "https://example.com/new"},
+        "switch_tab": {"tabId": 1},
+        "close_tab": {"tabId": 2},
+        "xpath_query": {"xpath": "//a/@href", "max_results": 5},
+    }
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def read_peak_rss_kb(pid: int) -> int:
+    """读取进程峰值常驻内存（KB），仅 Linux /proc 可用，其他平台返回 0"""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class ServerProcess:
+    """server.py 子进程，按 stdin/stdout JSON 协议收发命令"""
+
+    def __init__(self, port: int, concurrency: int, extra_args: list):
+        self.port = port
+        self.concurrency = concurrency
+        self.extra_args = extra_args
+        self.proc = None
+        self._responses: dict = {}
+        self._reader_task = None
+        self._next_id = 0
+        self.peak_rss_kb = 0
+
+    async def start(self):
+        args = [sys.executable, str(SERVER_SCRIPT), "--port", str(self.port)]
+        if self.concurrency > 1:
+            args += ["--pipeline", "--max-concurrency", str(self.concurrency)]
+        args += self.extra_args
+        self.proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=64 * 1024 * 1024,
+        )
+        self._reader_task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                break
+            self.peak_rss_kb = max(self.peak_rss_kb, read_peak_rss_kb(self.proc.pid))
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # 流水线模式按 id 分发；顺序模式响应按发送顺序到达
+            key = data.get("id") if self.concurrency > 1 else min(self._responses, default=None)
+            future = self._responses.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(data)
+
+    async def call(self, action: str, params: dict, timeout: float = 120.0) -> dict:
+        self._next_id += 1
+        cmd_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._responses[cmd_id] = future
+        cmd = {"action": action, "params": params}
+        if self.concurrency > 1:
+            cmd["id"] = cmd_id
+        self.proc.stdin.write((json.dumps(cmd) + "\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+        return await asyncio.wait_for(future, timeout)
+
+    async def stop(self):
+        if self.proc is None:
+            return
+        try:
+            await self.call("quit", {}, timeout=10)
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(self.proc.wait(), 10)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+        if self._reader_task:
+            self._reader_task.cancel()
+
+
+async def run_benchmark(args) -> dict:
+    tool_names = args.tools.split(",") if args.tools else list(TOOLS.keys())
+    unknown = [name for name in tool_names if name not in TOOLS]
+    if unknown:
+        raise SystemExit(f"未知工具: {', '.join(unknown)}")
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench-"))
+    params = bench_params(tmp_dir)
+    server = ServerProcess(args.port, args.concurrency, shlex.split(args.server_args))
+    extension = extension_from_args(args, args.port)
+
+    await server.start()
+    ext_task = asyncio.create_task(extension.run())
+
+    # 等待扩展连接
+    deadline = time.monotonic() + 30
+    while True:
+        status = await server.call("status", {})
+        if status.get("data", {}).get("connected"):
+            break
+        if time.monotonic() > deadline:
+            raise SystemExit("等待模拟扩展连接超时")
+        await asyncio.sleep(0.2)
+
+    latencies = {name: [] for name in tool_names}
+    errors = {name: 0 for name in tool_names}
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+
+    async def timed(name: str):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await server.call(name, params.get(name, {}))
+                ok = result.get("success", False)
+            except Exception:
+                ok = False
+            latencies[name].append(time.perf_counter() - start)
+            if not ok:
+                errors[name] += 1
+
+    # 预热
+    for name in tool_names:
+        await timed(name)
+    for name in tool_names:
+        latencies[name].clear()
+        errors[name] = 0
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        if args.concurrency > 1:
+            await asyncio.gather(*(timed(name) for name in tool_names))
+        else:
+            for name in tool_names:
+                await timed(name)
+    wall = time.perf_counter() - start
+
+    peak_rss_kb = max(server.peak_rss_kb, read_peak_rss_kb(server.proc.pid))
+    await server.stop()
+    ext_task.cancel()
+
+    total = sum(len(v) for v in latencies.values())
+    report = {
+        "config": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "snapshot_lines": args.snapshot_lines,
+            "html_mb": args.html_mb,
+            "screenshot_kb": args.screenshot_kb,
+            "server_args": args.server_args,
+        },
+        "wall_s": round(wall, 3),
+        "commands": total,
+        "throughput_per_s": round(total / wall, 2) if wall else 0.0,
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1) if peak_rss_kb else None,
+        "tools": {},
+    }
+    for name in tool_names:
+        values = latencies[name]
+        report["tools"][name] = {
+            "count": len(values),
+            "errors": errors[name],
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"{'tool':<18}{'count':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name, row in report["tools"].items():
+        print(
+            f"{name:<18}{row['count']:>7}{row['errors']:>5}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['mean_ms']:>10.2f}"
+        )
+    rss = f"{report['peak_rss_mb']} MB" if report["peak_rss_mb"] is not None else "n/a"
+    print(
+        f"\n共 {report['commands']} 条命令，耗时 {report['wall_s']} s，"
+        f"吞吐 {report['throughput_per_s']} 条/s，服务器峰值内存 {rss}"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Browser Chrome Agent 端到端基准测试（使用模拟扩展）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"测试用端口（默认: {DEFAULT_PORT}）")
+    parser.add_argument("--iterations", type=int, default=20, help="每个工具的执行轮数（默认 20）")
+    parser.add_argument("--concurrency", type=int, default=1, help="并发命令数，>1 时以 --pipeline 模式启动服务器")
+    parser.add_argument("--tools", type=str, default="", help="只测试指定工具（逗号分隔），默认全部")
+    parser.add_argument("--server-args", type=str, default="", help="传给 server.py 的额外参数")
+    parser.add_argument("--output", type=str, default="", help="将 JSON 报告写入文件")
+    add_extension_args(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"报告已写入: {args.output}")
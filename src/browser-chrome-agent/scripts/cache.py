@@ -0,0 +1,191 @@
+"""
+页面缓存
+
+缓存最近一次获取的页面快照、URL、标题及解析后的节点树，
+让连续的只读查询（find_element → find_and_locate → get_text）直接复用；
+同时缓存 xpath_query 解析后的 DOM 树。
+任何会改变页面的操作执行前后都会使缓存失效，与之重叠的其他读取不会写入缓存。
+同一页面版本同时只进行一次快照获取，其他读取等待它的结果（含后台预取）。
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import contextvars
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Optional
+
+DEFAULT_TTL = 30.0
+DEFAULT_DOM_CACHE_MB = 64
+# lxml 树的内存占用约为 HTML 文本长度的数倍，用于估算缓存大小
+DOM_SIZE_FACTOR = 4
+
+# 当前任务所属的改变页面的操作（PageCache.mutation 设置，派生的任务继承）
+_mutation: contextvars.ContextVar = contextvars.ContextVar("page_mutation", default=None)
+
+
+class PageState:
+    """某一页面版本的快照及其元信息"""
+
+    __slots__ = ("url", "title", "snapshot", "tree", "fetched_at")
+
+    def __init__(self, url: str, title: str, snapshot: str, tree):
+        self.url = url
+        self.title = title
+        self.snapshot = snapshot
+        self.tree = tree
+        self.fetched_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class PageCache:
+    """当前页面的快照缓存"""
+
+    def __init__(self):
+        self._state: Optional[PageState] = None
+        # 每次失效递增，用于丢弃失效前发起、失效后才返回的快照
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        # 加入进行中获取的次数（计入 misses）
+        self.joins = 0
+        # 进行中的快照获取 (epoch, task)
+        self._pending: Optional[tuple] = None
+        # 正在执行的改变页面的操作，以及写入当前缓存的操作
+        self._mutations: set = set()
+        self._owner = None
+
+    def get(self, ttl: float = DEFAULT_TTL) -> Optional[PageState]:
+        """返回仍然有效的缓存页面状态，没有则返回 None
+
+        Args:
+            ttl: 缓存有效秒数。页面可能自行变化（如异步加载），超时后视为失效。0 表示不过期
+        """
+        state = self._state
+        if state is not None and ttl > 0 and state.age() > ttl:
+            self._state = state = None
+        if state is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return state
+
+    def store(self, url: str, title: str, snapshot: str, tree, epoch: Optional[int] = None) -> PageState:
+        """写入新的页面状态
+
+        Args:
+            epoch: 发起获取时的 epoch。若期间缓存已失效，则只返回结果而不写入缓存
+
+        有改变页面的操作正在执行时，只接受该操作自身的写入（其他读取可能取到操作前的页面）。
+        """
+        state = PageState(url, title, snapshot, tree)
+        owner = _mutation.get()
+        if (epoch is None or epoch == self.epoch) and (not self._mutations or owner in self._mutations):
+            self._state = state
+            self._owner = owner
+        return state
+
+    def inflight(self):
+        """返回当前 epoch 下进行中的快照获取 task，没有则返回 None"""
+        if self._pending is not None:
+            epoch, task = self._pending
+            if epoch == self.epoch and not task.done():
+                return task
+            self._pending = None
+        return None
+
+    def track(self, task):
+        """登记一次进行中的快照获取，供同一页面版本的其他读取等待"""
+        self._pending = (self.epoch, task)
+
+    def invalidate(self):
+        self._state = None
+        self._owner = None
+        self.epoch += 1
+
+    @contextmanager
+    def mutation(self):
+        """包裹一次改变页面的操作，开始前和结束后都使缓存失效
+
+        结束时再次失效，丢弃操作期间发起的其他读取（它们捕获的 epoch 随之过期）；
+        操作自身写入的快照（如操作后的页面快照）保留。
+        """
+        token = object()
+        self.invalidate()
+        self._mutations.add(token)
+        var_token = _mutation.set(token)
+        try:
+            yield
+        finally:
+            _mutation.reset(var_token)
+            self._mutations.discard(token)
+            keep = self._state if self._owner is token else None
+            self.invalidate()
+            self._state = keep
+
+
+class DomCache:
+    """解析后的 DOM 树缓存，按 key（如标签页 id）存储，LRU 淘汰并限制估算内存
+
+    每个条目记录写入时的页面缓存 epoch，epoch 变化（页面被操作过）即视为失效。
+    """
+
+    def __init__(self):
+        self._entries: OrderedDict = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, epoch: int, ttl: float = DEFAULT_TTL) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry_epoch, tree, _, fetched_at = entry
+            if entry_epoch != epoch or (ttl > 0 and time.monotonic() - fetched_at > ttl):
+                self.invalidate(key)
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return tree
+
+    def store(self, key, epoch: int, tree, html_length: int, max_mb: float = DEFAULT_DOM_CACHE_MB):
+        """写入解析后的树，超过内存上限时淘汰最久未使用的条目"""
+        self.invalidate(key)
+        size = html_length * DOM_SIZE_FACTOR
+        max_bytes = max_mb * 1024 * 1024
+        if size > max_bytes:
+            return
+        self._entries[key] = (epoch, tree, size, time.monotonic())
+        self.total_bytes += size
+        while self.total_bytes > max_bytes and self._entries:
+            _, (_, _, old_size, _) = self._entries.popitem(last=False)
+            self.total_bytes -= old_size
+
+    def invalidate(self, key=None):
+        """使指定 key 的条目失效，key 为 None 时清空全部"""
+        if key is None:
+            self._entries.clear()
+            self.total_bytes = 0
+            return
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
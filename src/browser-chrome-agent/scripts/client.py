@@ -0,0 +1,136 @@
+"""
+Browser Chrome Agent - 轻量客户端
+
+把一条命令通过本地 Unix socket 转发给常驻的 server.py 守护进程（--daemon）并输出结果。
+守护进程保持与扩展的 WebSocket 连接，单次命令只需一次往返，扩展无需重连。
+守护进程未运行时自动在后台启动（--no-start 关闭）。
+控制 socket 是 Unix socket，不支持的平台（Windows）上请直接使用 server.py。
+
+只依赖标准库，启动开销小。
+
+用法:
+  python3 client.py --action navigate --params '{"url": "https://example.com"}'
+  python3 client.py --action find_element --params '{"keyword": "登录"}' --port 9009
+  python3 client.py --action quit           # 关闭守护进程
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import time
+from typing import Optional
+
+DEFAULT_PORT = 9009
+DEFAULT_TIMEOUT = 300.0
+DAEMON_START_TIMEOUT = 10.0
+SERVER_SCRIPT = Path(__file__).parent / "server.py"
+# Windows 的 socket 模块没有 AF_UNIX，守护进程和命令转发不可用
+SUPPORTS_UNIX_SOCKET = hasattr(socket, "AF_UNIX")
+
+
+def socket_path(port: int) -> str:
+    """守护进程控制 socket 的默认路径（按端口区分）"""
+    return os.path.join(tempfile.gettempdir(), f"browser-chrome-agent-{port}.sock")
+
+
+def daemon_log_path(port: int) -> str:
+    return os.path.join(tempfile.gettempdir(), f"browser-chrome-agent-{port}.log")
+
+
+def connect(path: str, timeout: Optional[float] = DEFAULT_TIMEOUT) -> socket.socket:
+    """连接守护进程，未运行或平台不支持 Unix socket 时抛出 OSError"""
+    if not SUPPORTS_UNIX_SOCKET:
+        raise OSError("当前平台不支持 Unix socket，无法连接守护进程，请直接使用 server.py")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def send_command(path: str, action: str, params: dict = None, timeout: Optional[float] = DEFAULT_TIMEOUT) -> dict:
+    """发送一条命令并返回结果 dict"""
+    with connect(path, timeout) as sock:
+        line = json.dumps({"action": action, "params": params or {}}, ensure_ascii=False) + "\n"
+        sock.sendall(line.encode("utf-8"))
+        with sock.makefile("rb") as f:
+            response = f.readline()
+    if not response:
+        raise ConnectionError("守护进程未返回结果就关闭了连接")
+    return json.loads(response)
+
+
+def start_daemon(port: int, path: str, timeout: float = DAEMON_START_TIMEOUT):
+    """在后台启动守护进程，等待控制 socket 可连接"""
+    log_file = open(daemon_log_path(port), "ab")
+    subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT), "--daemon", "--port", str(port), "--socket", path],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=log_file,
+        start_new_session=True,
+    )
+    log_file.close()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connect(path, timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"守护进程 {timeout:g}s 内未就绪，日志: {daemon_log_path(port)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Browser Chrome Agent 客户端：把命令转发给常驻守护进程"
+    )
+    parser.add_argument("--action", type=str, required=True, help="操作名（如 navigate, click, status, quit）")
+    parser.add_argument("--params", type=str, default="{}", help="操作参数（JSON 字符串）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"守护进程的 WebSocket 端口（默认: {DEFAULT_PORT}）")
+    parser.add_argument("--socket", type=str, default=None, help="控制 socket 路径（默认按端口放在临时目录）")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help=f"等待结果的超时秒数（默认: {DEFAULT_TIMEOUT:g}）")
+    parser.add_argument("--no-start", action="store_true", help="守护进程未运行时不自动启动")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    params = json.loads(args.params) if args.params else {}
+    path = args.socket or socket_path(args.port)
+    try:
+        if not SUPPORTS_UNIX_SOCKET:
+            raise OSError("当前平台不支持 Unix socket，无法使用守护进程，请直接使用 server.py")
+        try:
+            connect(path, timeout=1).close()
+        except OSError:
+            if args.no_start or args.action == "quit":
+                raise ConnectionError(f"守护进程未运行（{path}）")
+            print(f"[client] 启动守护进程，端口 {args.port}", file=sys.stderr, flush=True)
+            start_daemon(args.port, path)
+        result = send_command(path, args.action, params, timeout=args.timeout)
+    except (OSError, ValueError) as e:
+        result = {"success": False, "error": str(e)}
+    print(json.dumps(result, ensure_ascii=False), flush=True)
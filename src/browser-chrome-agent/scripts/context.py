@@ -2,6 +2,7 @@
 WebSocket 连接上下文管理
 
 管理与 Chrome 扩展的 WebSocket 连接，提供请求-响应消息机制。
+ContextPool 管理多个浏览器（Chrome 配置文件）的连接，按名称或负载路由命令。
 """
 
 # === 依赖加载 ===
@@ -22,16 +23,53 @@ while _p != _p.parent:
 
 import asyncio
 import json
+import time
 import uuid
+from contextlib import contextmanager
 from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+from cache import DomCache, PageCache
+from metrics import Metrics
+from tabs import TabScheduler
+
+
+# 连续超时达到该次数的连接视为不健康，负载路由时不再选择
+UNHEALTHY_TIMEOUTS = 3
+# 扩展连接后可发送的握手消息类型，payload 中的 browserId 作为连接名称
+HANDSHAKE_TYPES = ("hello", "handshake")
+# 未指定名称的连接使用的名称；同名新连接替换旧连接
+DEFAULT_BROWSER = "default"
 
 
 class Context:
-    """WebSocket 连接上下文，管理与 Chrome 扩展的通信"""
+    """WebSocket 连接上下文，管理与单个 Chrome 扩展的通信
+
+    Args:
+        name: 浏览器名称（连接池中的 key）
+        metrics: 共享的指标对象，默认新建
+    """
 
-    def __init__(self):
+    def __init__(self, name: str = "default", metrics: Optional[Metrics] = None):
+        self.name = name
         self._ws = None
         self._pending: dict[str, asyncio.Future] = {}
+        # 每个标签页一份快照缓存 {tab_id: PageCache}，切换标签页不会丢失
+        self.page_caches: dict = {}
+        self.dom_cache = DomCache()
+        # 扩展当前操作的标签页 id（由标签页工具和调度器更新，未知时为 None）
+        self.active_tab_id = None
+        self.tabs = TabScheduler(self)
+        # 每个标签页上一次输出的快照 {tab_id: (url, AriaSnapshot)}，作为增量快照的基准
+        self.snapshot_bases: dict = {}
+        self.metrics = metrics or Metrics()
+        # 健康状态
+        self.connected_at = time.monotonic()
+        self.consecutive_timeouts = 0
+        # 正在执行的命令数，与 _pending 一起作为负载
+        self.active_commands = 0
+        # 后台任务（快照预取），连接关闭时取消
+        self.background: set = set()
 
     @property
     def ws(self):
@@ -48,6 +86,56 @@ class Context:
     def has_ws(self) -> bool:
         return self._ws is not None
 
+    @property
+    def page_cache(self) -> PageCache:
+        """当前标签页的快照缓存"""
+        cache = self.page_caches.get(self.active_tab_id)
+        if cache is None:
+            cache = self.page_caches[self.active_tab_id] = PageCache()
+        return cache
+
+    @property
+    def healthy(self) -> bool:
+        return self._ws is not None and self.consecutive_timeouts < UNHEALTHY_TIMEOUTS
+
+    @property
+    def load(self) -> int:
+        return self.active_commands + len(self._pending)
+
+    def health(self) -> dict:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "load": self.load,
+            "pending": len(self._pending),
+            "consecutive_timeouts": self.consecutive_timeouts,
+            "active_tab": self.active_tab_id,
+            "tab_switches": self.tabs.switches,
+            "queued": self.tabs.queued,
+            "connected_s": round(time.monotonic() - self.connected_at, 1),
+        }
+
+    @contextmanager
+    def page_mutation(self):
+        """包裹改变页面的操作：前后都清空当前标签页的缓存，期间其他读取不写入缓存
+
+        操作中途可能切换标签页（new_tab/close_tab），因此固定使用开始时的标签页。
+        """
+        tab_id = self.active_tab_id
+        self.dom_cache.invalidate(tab_id)
+        try:
+            with self.page_cache.mutation():
+                yield
+        finally:
+            self.dom_cache.invalidate(tab_id)
+
+    def forget_tab(self, tab_id):
+        """标签页已关闭：丢弃其缓存和状态"""
+        self.page_caches.pop(tab_id, None)
+        self.dom_cache.invalidate(tab_id)
+        self.snapshot_bases.pop(tab_id, None)
+        self.tabs.forget(tab_id)
+
     async def send_message(
         self,
         msg_type: str,
@@ -67,20 +155,91 @@ class Context:
         self._pending[msg_id] = future
 
         try:
-            await self.ws.send(json.dumps(message))
+            text = json.dumps(message)
+            ws = self.ws
+            self.metrics.request(msg_id, msg_type, len(text))
+            await ws.send(text)
             result = await asyncio.wait_for(future, timeout=timeout_ms / 1000)
             return result
         except asyncio.TimeoutError:
+            self.metrics.timeout(msg_id)
+            self.consecutive_timeouts += 1
             raise TimeoutError(f"消息 '{msg_type}' 超时（{timeout_ms}ms）")
         finally:
             self._pending.pop(msg_id, None)
+            self.metrics.finish(msg_id)
+
+    async def send_batch(
+        self,
+        messages: list,
+        timeout_ms: int = 30000,
+    ) -> list:
+        """批量发送多条 WebSocket 消息并一次性等待全部响应
+
+        所有消息先连续发出，再统一等待结果，总耗时约为一次往返。
+        任一消息失败或超时则整体失败，其余未完成的请求会被取消。
+
+        Args:
+            messages: 消息列表，每项为 msg_type 字符串或 (msg_type, payload) 元组
+            timeout_ms: 整批消息的超时时间
 
-    def handle_response(self, data: dict):
-        """处理来自扩展的响应消息"""
+        Returns:
+            与 messages 顺序一致的结果列表
+        """
+        loop = asyncio.get_event_loop()
+        batch = []
+        for item in messages:
+            msg_type, payload = (item, None) if isinstance(item, str) else item
+            msg_id = str(uuid.uuid4())
+            message = {"id": msg_id, "type": msg_type}
+            if payload is not None:
+                message["payload"] = payload
+            future: asyncio.Future = loop.create_future()
+            self._pending[msg_id] = future
+            batch.append((msg_id, msg_type, message, future))
+
+        try:
+            ws = self.ws
+            for msg_id, msg_type, message, _ in batch:
+                text = json.dumps(message)
+                self.metrics.request(msg_id, msg_type, len(text))
+                await ws.send(text)
+            futures = [future for _, _, _, future in batch]
+            done, not_done = await asyncio.wait(
+                futures,
+                timeout=timeout_ms / 1000,
+                return_when=asyncio.FIRST_EXCEPTION,
+            )
+            for future in futures:
+                if future in done and future.exception() is not None:
+                    raise future.exception()
+            if not_done:
+                for msg_id, _, _, future in batch:
+                    if future in not_done:
+                        self.metrics.timeout(msg_id)
+                self.consecutive_timeouts += 1
+                waiting = [msg_type for _, msg_type, _, future in batch if future in not_done]
+                raise TimeoutError(f"批量消息 {waiting} 超时（{timeout_ms}ms）")
+            return [future.result() for future in futures]
+        finally:
+            for msg_id, _, _, future in batch:
+                if not future.done():
+                    future.cancel()
+                self._pending.pop(msg_id, None)
+                self.metrics.finish(msg_id)
+
+    def handle_response(self, data: dict, size: int = 0):
+        """处理来自扩展的响应消息
+
+        Args:
+            size: 原始消息长度，用于统计响应字节数
+        """
         # 扩展响应格式: {"id": "新UUID", "type": "messageResponse", "payload": {"requestId": "原始ID", "result": ..., "error": ...}}
         payload = data.get("payload", {})
         msg_id = payload.get("requestId") or data.get("id")
+        self.metrics.response(msg_id, size, error=bool(payload.get("error") or data.get("error")))
         if msg_id and msg_id in self._pending:
+            self.consecutive_timeouts = 0
             future = self._pending[msg_id]
             if not future.done():
                 error = payload.get("error") or data.get("error")
@@ -90,7 +249,115 @@ class Context:
                     result = payload.get("result") if payload.get("result") is not None else data.get("result", data.get("data"))
                     future.set_result(result)
 
+    def spawn(self, coro) -> asyncio.Task:
+        """启动属于该连接的后台任务"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+        return task
+
+    def cancel_background(self):
+        for task in list(self.background):
+            task.cancel()
+
     async def close(self):
+        self.cancel_background()
         if self._ws:
             await self._ws.close()
             self._ws = None
+
+
+class ContextPool:
+    """多浏览器连接池
+
+    每个扩展连接对应一个 Context（独立的 pending 表、缓存和健康状态），按名称索引。
+    连接名称取自连接 URL 的 browser 参数（ws://localhost:9009/?browser=work），
+    或连接后发送的握手消息 {"type": "hello", "payload": {"browserId": "work"}}；
+    都没有时使用 DEFAULT_BROWSER。同名的新连接会替换旧连接，因此未命名的扩展重连时
+    直接替换旧连接（半开的旧连接不会继续接收命令）。
+
+    Args:
+        prefetch: 改变页面的操作完成后是否在后台预取快照（命令可用 params.prefetch 覆盖）
+    """
+
+    def __init__(self, prefetch: bool = False):
+        self.prefetch = prefetch
+        self.metrics = Metrics()
+        self.contexts: dict[str, Context] = {}
+        # 至少有一个扩展连接时置位
+        self._connected = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def has_ws(self) -> bool:
+        return any(ctx.has_ws() for ctx in self.contexts.values())
+
+    async def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """等待至少一个扩展连接，返回是否已连接"""
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.has_ws()
+
+    def name_from_path(self, path: str) -> str:
+        """从连接路径的查询参数解析浏览器名称，没有则为 DEFAULT_BROWSER"""
+        query = parse_qs(urlparse(path or "").query)
+        return (query.get("browser") or [""])[0].strip() or DEFAULT_BROWSER
+
+    async def attach(self, name: str, websocket) -> Context:
+        """注册新连接，替换同名的旧连接"""
+        old = self.contexts.get(name)
+        if old is not None:
+            await old.close()
+        ctx = Context(name, metrics=self.metrics)
+        ctx.ws = websocket
+        self.contexts[name] = ctx
+        self._connected.set()
+        return ctx
+
+    async def rename(self, ctx: Context, name: str):
+        """按握手消息重命名连接，替换同名的旧连接"""
+        if not name or name == ctx.name:
+            return
+        old = self.contexts.get(name)
+        if old is not None and old is not ctx:
+            await old.close()
+        if self.contexts.get(ctx.name) is ctx:
+            del self.contexts[ctx.name]
+        ctx.name = name
+        self.contexts[name] = ctx
+
+    def detach(self, ctx: Context, websocket):
+        """连接断开时移除（已被同名新连接替换时不影响新连接）"""
+        if ctx._ws is websocket:
+            ctx._ws = None
+            ctx.cancel_background()
+        if self.contexts.get(ctx.name) is ctx:
+            del self.contexts[ctx.name]
+        if not self.has_ws():
+            self._connected.clear()
+
+    def select(self, browser: Optional[str] = None) -> Context:
+        """选择执行命令的连接
+
+        Args:
+            browser: 指定浏览器名称；为空时选择负载最低的健康连接（没有健康连接时退回任意已连接的）
+        """
+        if browser:
+            ctx = self.contexts.get(browser)
+            if ctx is None or not ctx.has_ws():
+                available = ", ".join(sorted(self.contexts)) or "无"
+                raise ConnectionError(f"浏览器 '{browser}' 未连接。已连接: {available}")
+            return ctx
+        connected = [ctx for ctx in self.contexts.values() if ctx.has_ws()]
+        if not connected:
+            raise ConnectionError("未连接到浏览器扩展。请先点击扩展图标并连接。")
+        candidates = [ctx for ctx in connected if ctx.healthy] or connected
+        return min(candidates, key=lambda ctx: (ctx.load, ctx.connected_at))
+
+    async def close(self):
+        for ctx in list(self.contexts.values()):
+            await ctx.close()
+        self.contexts.clear()
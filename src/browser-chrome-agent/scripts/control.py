@@ -0,0 +1,198 @@
+"""
+本地控制 socket
+
+在 Unix socket 上接收命令，协议与 stdin 相同（每行一个 JSON {"action", "params"}），
+每条命令返回一行 JSON 结果。可同时连接多个客户端（agent、脚本、监控）：
+
+- 不带 id 的命令按顺序执行，结果按顺序返回
+- 带 id 的命令并发执行，结果带回同一 id，按完成顺序返回（可能乱序）
+- 所有客户端（以及 stdin）的工具命令由 FairScheduler 轮流调度到共享的浏览器连接上，
+  一个客户端提交大量命令不会饿死其他客户端
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import asyncio
+import json
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from itertools import count
+from typing import Awaitable, Callable
+
+# 单行命令的最大长度
+MAX_LINE = 16 * 1024 * 1024
+
+
+class FairScheduler:
+    """多客户端公平调度：限制总并发数，空闲名额按客户端轮流分配
+
+    Args:
+        max_concurrency: 同时执行的最大命令数
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.running = 0
+        # client_id -> 等待中的 future 队列，按轮转顺序排列
+        self._queues: OrderedDict = OrderedDict()
+
+    @property
+    def queued(self) -> dict:
+        return {client: len(queue) for client, queue in self._queues.items()}
+
+    def _dispatch(self):
+        while self.running < self.max_concurrency and self._queues:
+            client, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            if future.done():
+                continue
+            self.running += 1
+            future.set_result(None)
+
+    async def acquire(self, client):
+        if self.running < self.max_concurrency and not self._queues:
+            self.running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(client, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, client):
+        await self.acquire(client)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ControlServer:
+    """控制 socket 服务
+
+    Args:
+        path: Unix socket 路径，已存在的旧文件会被删除
+        handle: handle(cmd, client_id) -> 结果 dict 的协程函数
+        quit_closes_client: 为 True 时 quit 命令只断开该客户端（非守护进程模式）
+    """
+
+    def __init__(self, path: str, handle: Callable[[dict, str], Awaitable[dict]], quit_closes_client: bool = False):
+        self.path = path
+        self.handle = handle
+        self.quit_closes_client = quit_closes_client
+        self.clients: set[str] = set()
+        self._ids = count(1)
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve_client, path=self.path, limit=MAX_LINE)
+        # 仅当前用户可连接
+        os.chmod(self.path, 0o600)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def _run(self, cmd: dict, client_id: str) -> dict:
+        try:
+            result = await self.handle(cmd, client_id)
+        except Exception as e:
+            result = {"success": False, "error": f"内部错误: {e}"}
+        if "id" in cmd:
+            result = {"id": cmd["id"], **result}
+        return result
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client_id = f"socket-{next(self._ids)}"
+        self.clients.add(client_id)
+        write_lock = asyncio.Lock()
+        in_flight: set[asyncio.Task] = set()
+
+        async def send(result: dict):
+            async with write_lock:
+                writer.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        async def run_concurrent(cmd: dict):
+            result = await self._run(cmd, client_id)
+            try:
+                await send(result)
+            except ConnectionError:
+                pass
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await send({"success": False, "error": "命令过长"})
+                    break
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    cmd = json.loads(line)
+                except json.JSONDecodeError as e:
+                    await send({"success": False, "error": f"无效 JSON: {e}"})
+                    continue
+
+                if cmd.get("action") == "quit" and self.quit_closes_client:
+                    if in_flight:
+                        await asyncio.gather(*in_flight, return_exceptions=True)
+                    await send({**({"id": cmd["id"]} if "id" in cmd else {}),
+                                "success": True, "data": {"message": "已断开控制连接"}})
+                    break
+                if "id" in cmd and cmd.get("action") != "quit":
+                    task = asyncio.create_task(run_concurrent(cmd))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    continue
+                # 不带 id 的命令（以及 quit）等此前提交的命令完成后按顺序执行
+                if in_flight:
+                    await asyncio.gather(*in_flight, return_exceptions=True)
+                await send(await self._run(cmd, client_id))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # 客户端断开后，已提交的命令仍执行完，结果丢弃
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            self.clients.discard(client_id)
+            writer.close()
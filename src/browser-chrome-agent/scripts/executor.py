@@ -0,0 +1,164 @@
+"""
+CPU 密集任务执行器
+
+将 HTML 解析、快照解析、base64 解码、大消息 JSON 解码等耗时操作移出 asyncio 事件循环，
+避免阻塞 WebSocket 读取导致其他在途请求超时。同时监测事件循环延迟。
+
+默认使用线程池；mode="process" 时，超过阈值的可序列化解析任务（如 ARIA 快照解析）
+改在进程池中执行，完全绕开 GIL。
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+DEFAULT_WORKERS = 4
+# 小于该字节数的任务直接在事件循环中执行，省去线程切换开销
+DEFAULT_INLINE_THRESHOLD = 64 * 1024
+# mode="process" 时，超过该字节数的解析任务使用进程池
+DEFAULT_PROCESS_THRESHOLD = 2 * 1024 * 1024
+
+
+class Executor:
+    """线程池 / 进程池执行器
+
+    Args:
+        mode: "thread"（默认）或 "process"
+        max_workers: 线程池（及进程池）的工作者数量
+        inline_threshold: 小于该大小的任务直接同步执行
+        process_threshold: mode="process" 时使用进程池的最小任务大小
+    """
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: int = DEFAULT_WORKERS,
+        inline_threshold: int = DEFAULT_INLINE_THRESHOLD,
+        process_threshold: int = DEFAULT_PROCESS_THRESHOLD,
+    ):
+        self.mode = mode
+        self.max_workers = max_workers
+        self.inline_threshold = inline_threshold
+        self.process_threshold = process_threshold
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="cpu"
+            )
+        return self._threads
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._processes
+
+    async def run(self, fn: Callable, *args, size: int = -1, picklable: bool = False, **kwargs) -> Any:
+        """在执行器中运行 fn(*args, **kwargs)
+
+        Args:
+            size: 任务数据量（字节/字符数），用于选择执行方式；-1 表示未知，总是放入线程池
+            picklable: fn、参数和返回值可被 pickle，允许在 mode="process" 时使用进程池
+        """
+        if 0 <= size < self.inline_threshold:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        call = partial(fn, *args, **kwargs)
+        if picklable and self.mode == "process" and size >= self.process_threshold:
+            return await loop.run_in_executor(self._process_pool(), call)
+        return await loop.run_in_executor(self._thread_pool(), call)
+
+    def shutdown(self):
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+
+
+class LoopLagMonitor:
+    """定时唤醒并测量实际唤醒延迟，反映事件循环被阻塞的程度
+
+    Args:
+        interval: 采样间隔（秒）
+        window: 保留的最近样本数
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600):
+        self.interval = interval
+        self._samples: deque = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - start - self.interval, 0.0)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def snapshot(self) -> dict:
+        """返回事件循环延迟统计（毫秒）"""
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0}
+
+        def pct(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2)
+
+        return {
+            "samples": len(samples),
+            "p50_ms": pct(0.5),
+            "p99_ms": pct(0.99),
+            "window_max_ms": round(samples[-1] * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+# 全局执行器，由 server.py 按命令行参数配置
+executor = Executor()
+lag_monitor = LoopLagMonitor()
+
+
+def configure(mode: str = "thread", max_workers: int = DEFAULT_WORKERS, process_threshold: int = DEFAULT_PROCESS_THRESHOLD):
+    """重新配置全局执行器"""
+    global executor
+    executor.shutdown()
+    executor = Executor(mode=mode, max_workers=max_workers, process_threshold=process_threshold)
+
+
+async def run_cpu(fn: Callable, *args, size: int = -1, picklable: bool = False, **kwargs) -> Any:
+    """在全局执行器中运行 CPU 密集任务，参数同 Executor.run"""
+    return await executor.run(fn, *args, size=size, picklable=picklable, **kwargs)
@@ -0,0 +1,327 @@
+"""
+模拟 Chrome 扩展
+
+不依赖真实 Chrome 和 Browser MCP 扩展，作为 WebSocket 客户端连接 server.py，
+按扩展的 messageResponse 协议应答所有工具用到的消息，用于基准测试和本地调试。
+
+用法:
+  python3 fake_extension.py --port 9009
+  python3 fake_extension.py --port 9009 --latency 0.05 --snapshot-lines 20000 --html-mb 5
+  python3 fake_extension.py --port 9009 --browser work   # 以指定名称加入多浏览器连接池
+
+可配置:
+  - 每条消息的延迟（及抖动、按消息类型覆盖）
+  - 负载大小：快照行数、HTML 大小、截图大小
+  - 错误注入（返回 error）与超时注入（不应答）
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import uuid
+from typing import Optional
+from urllib.parse import quote
+
+import websockets
+
+DEFAULT_PORT = 9009
+
+
+class FakeExtension:
+    """模拟扩展的 WebSocket 客户端
+
+    Args:
+        port: server.py 的 WebSocket 端口
+        latency: 每条消息的基础延迟（秒）
+        jitter: 延迟随机抖动上限（秒）
+        latencies: 按消息类型覆盖延迟，如 {"browser_snapshot": 0.2}
+        snapshot_lines: 快照行数
+        html_mb: getPageHtml 返回的 HTML 大小（MB）
+        screenshot_kb: 截图原始大小（KB，返回 base64）
+        error_rate: 返回错误的概率
+        timeout_rate: 不应答（让服务器超时）的概率
+        seed: 随机种子
+        browser: 浏览器名称（连接 URL 的 browser 参数），为空时使用服务器的默认名称
+    """
+
+    def __init__(
+        self,
+        port: int = DEFAULT_PORT,
+        latency: float = 0.01,
+        jitter: float = 0.0,
+        latencies: Optional[dict] = None,
+        snapshot_lines: int = 500,
+        html_mb: float = 0.1,
+        screenshot_kb: int = 100,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        seed: Optional[int] = None,
+        browser: str = "",
+    ):
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.latencies = latencies or {}
+        self.snapshot_lines = snapshot_lines
+        self.html_mb = html_mb
+        self.screenshot_kb = screenshot_kb
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self._random = random.Random(seed)
+        self.browser = browser
+
+        self.generation = 0
+        self.url = "https://example.com/"
+        self.history = [self.url]
+        self.history_pos = 0
+        self.tabs = {1: {"id": 1, "title": "Example", "url": self.url}}
+        self.active_tab = 1
+        self.received = 0
+        self._html: Optional[str] = None
+        self._screenshot: Optional[str] = None
+        self._ws = None
+
+    # === 负载生成 ===
+
+    def _snapshot(self) -> str:
+        self.generation += 1
+        g = self.generation
+        lines = [f"- generic [ref=s{g}e1]:"]
+        roles = ("button", "link", "textbox", "heading", "listitem", "paragraph")
+        i = 2
+        while len(lines) < self.snapshot_lines:
+            role = roles[i % len(roles)]
+            if role == "link":
+                lines.append(f'  - link "Link {i}" [ref=s{g}e{i}]:')
+                lines.append(f"    - /url: /page/{i}")
+            elif role == "heading":
+                lines.append(f'  - heading "Section {i}" [level=2] [ref=s{g}e{i}]')
+            elif role == "paragraph":
+                lines.append(f"  - paragraph [ref=s{g}e{i}]: Paragraph text number {i}")
+            elif role == "listitem":
+                lines.append(f"  - listitem [ref=s{g}e{i}]:")
+                lines.append(f"    - text: Item {i}")
+            else:
+                lines.append(f'  - {role} "{role.title()} {i}" [ref=s{g}e{i}]')
+            i += 1
+        return "\n".join(lines[:self.snapshot_lines])
+
+    def _page_html(self) -> str:
+        if self._html is None:
+            target = int(self.html_mb * 1024 * 1024)
+            parts = ["<html><head><title>Example</title></head><body><h1>Example</h1>"]
+            size = len(parts[0])
+            i = 0
+            while size < target:
+                chunk = f'<div class="item"><a href="/page/{i}">Link {i}</a><p>Paragraph text number {i}</p></div>'
+                parts.append(chunk)
+                size += len(chunk)
+                i += 1
+            parts.append("</body></html>")
+            self._html = "".join(parts)
+        return self._html
+
+    def _screenshot_data(self) -> str:
+        if self._screenshot is None:
+            self._screenshot = base64.b64encode(os.urandom(self.screenshot_kb * 1024)).decode("ascii")
+        return self._screenshot
+
+    # === 消息处理 ===
+
+    def _handle(self, msg_type: str, payload: dict):
+        """返回消息结果，未知消息抛出异常"""
+        if msg_type == "getUrl":
+            return self.url
+        if msg_type == "getTitle":
+            return self.tabs[self.active_tab]["title"]
+        if msg_type == "browser_snapshot":
+            return self._snapshot()
+        if msg_type == "getPageHtml":
+            return self._page_html()
+        if msg_type == "browser_screenshot":
+            return self._screenshot_data()
+        if msg_type == "browser_navigate":
+            self.url = payload.get("url", self.url)
+            del self.history[self.history_pos + 1:]
+            self.history.append(self.url)
+            self.history_pos += 1
+            self.tabs[self.active_tab]["url"] = self.url
+            return None
+        if msg_type in ("browser_go_back", "browser_go_forward"):
+            step = -1 if msg_type == "browser_go_back" else 1
+            self.history_pos = min(max(self.history_pos + step, 0), len(self.history) - 1)
+            self.url = self.history[self.history_pos]
+            return None
+        if msg_type in (
+            "browser_click", "browser_click_at", "browser_hover", "browser_type",
+            "browser_select_option", "browser_drag", "browser_press_key", "browser_wait",
+        ):
+            return None
+        if msg_type == "browser_get_coordinates":
+            return {"x": 100, "y": 200}
+        if msg_type == "browser_get_console_logs":
+            return ["[log] fake extension"]
+        if msg_type == "browser_list_tabs":
+            return [
+                {**tab, "active": tab_id == self.active_tab, "windowId": 1}
+                for tab_id, tab in self.tabs.items()
+            ]
+        if msg_type == "browser_new_tab":
+            # 复用最小的空闲 id，使 new_tab / close_tab 可重复执行
+            tab_id = 2
+            while tab_id in self.tabs:
+                tab_id += 1
+            url = payload.get("url", "about:blank")
+            self.tabs[tab_id] = {"id": tab_id, "title": "New Tab", "url": url}
+            self.active_tab = tab_id
+            self.url = url
+            return {"id": tab_id, "title": "New Tab", "url": url}
+        if msg_type == "browser_switch_tab":
+            tab_id = payload.get("tabId")
+            if tab_id not in self.tabs:
+                raise RuntimeError(f"No tab with id: {tab_id}")
+            self.active_tab = tab_id
+            self.url = self.tabs[tab_id]["url"]
+            return dict(self.tabs[tab_id])
+        if msg_type == "browser_close_tab":
+            tab_id = payload.get("tabId")
+            if tab_id not in self.tabs or len(self.tabs) == 1:
+                raise RuntimeError(f"Cannot close tab: {tab_id}")
+            del self.tabs[tab_id]
+            switched_to = None
+            if tab_id == self.active_tab:
+                self.active_tab = switched_to = next(iter(self.tabs))
+                self.url = self.tabs[self.active_tab]["url"]
+            return {"closed": tab_id, "switchedTo": switched_to}
+        raise RuntimeError(f"Unknown message type: {msg_type}")
+
+    async def _respond(self, data: dict):
+        msg_type = data.get("type", "")
+        payload = data.get("payload") or {}
+        delay = self.latencies.get(msg_type, self.latency)
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if msg_type == "browser_wait":
+            delay += float(payload.get("time", 0))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.timeout_rate and self._random.random() < self.timeout_rate:
+            return
+        result, error = None, None
+        if self.error_rate and self._random.random() < self.error_rate:
+            error = f"Injected error for {msg_type}"
+        else:
+            try:
+                result = self._handle(msg_type, payload)
+            except Exception as e:
+                error = str(e)
+
+        response = {
+            "id": str(uuid.uuid4()),
+            "type": "messageResponse",
+            "payload": {"requestId": data.get("id"), "result": result, "error": error},
+        }
+        try:
+            await self._ws.send(json.dumps(response))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def run(self, connect_timeout: float = 30.0):
+        """连接服务器（失败时重试）并持续应答，直到连接关闭"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + connect_timeout
+        while True:
+            try:
+                query = f"/?browser={quote(self.browser)}" if self.browser else ""
+                ws = await websockets.connect(f"ws://localhost:{self.port}{query}", max_size=None)
+                break
+            except OSError:
+                if loop.time() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+        self._ws = ws
+        tasks = set()
+        try:
+            async for message in ws:
+                self.received += 1
+                task = asyncio.create_task(self._respond(json.loads(message)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._ws = None
+
+
+def add_extension_args(parser: argparse.ArgumentParser):
+    """注册模拟扩展的命令行参数（benchmark.py 复用）"""
+    parser.add_argument("--latency", type=float, default=0.01, help="每条消息的基础延迟（秒，默认 0.01）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟随机抖动上限（秒）")
+    parser.add_argument(
+        "--latency-by-type", type=str, default="{}",
+        help='按消息类型覆盖延迟（JSON），如 \'{"browser_snapshot": 0.2}\'',
+    )
+    parser.add_argument("--snapshot-lines", type=int, default=500, help="快照行数（默认 500）")
+    parser.add_argument("--html-mb", type=float, default=0.1, help="页面 HTML 大小（MB，默认 0.1）")
+    parser.add_argument("--screenshot-kb", type=int, default=100, help="截图大小（KB，默认 100）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误的概率（0-1）")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="不应答的概率（0-1）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--browser", type=str, default="", help="浏览器名称（多浏览器连接池中的 key）")
+
+
+def extension_from_args(args, port: int) -> FakeExtension:
+    return FakeExtension(
+        port=port,
+        latency=args.latency,
+        jitter=args.jitter,
+        latencies=json.loads(args.latency_by_type),
+        snapshot_lines=args.snapshot_lines,
+        html_mb=args.html_mb,
+        screenshot_kb=args.screenshot_kb,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        seed=args.seed,
+        browser=args.browser,
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="模拟 Browser MCP 扩展，连接 server.py 并应答消息")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"server.py 端口（默认: {DEFAULT_PORT}）")
+    add_extension_args(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    extension = extension_from_args(args, args.port)
+    print(f"[fake] 连接 ws://localhost:{args.port} ...", file=sys.stderr, flush=True)
+    try:
+        asyncio.run(extension.run())
+    except KeyboardInterrupt:
+        pass
+    print(f"[fake] 已断开，共处理 {extension.received} 条消息", file=sys.stderr, flush=True)
@@ -0,0 +1,257 @@
+"""
+运行指标统计
+
+记录每种扩展消息（msg_type）与每个工具的延迟分布、请求/响应字节数、超时次数，
+以及迟到响应（请求已超时或被取消、已从 _pending 移除后才到达的响应）。
+通过 server.py 的 stats 命令查看，或用 --stats-file 定期追加写入 JSONL 文件。
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# 直方图桶上界（毫秒），最后一个桶收纳更大的值
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+# 记住最近多少条被放弃的请求，用于识别迟到响应
+DROPPED_HISTORY = 1024
+DEFAULT_STATS_INTERVAL = 60.0
+
+
+class LatencyHistogram:
+    """固定桶延迟直方图，分位数取所在桶的上界（不超过实际最大值）"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        target = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                return min(BUCKET_BOUNDS_MS[i], self.max) if i < len(BUCKET_BOUNDS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        buckets = {}
+        for i, n in enumerate(self.counts):
+            if n:
+                label = f"<={BUCKET_BOUNDS_MS[i]}" if i < len(BUCKET_BOUNDS_MS) else f">{BUCKET_BOUNDS_MS[-1]}"
+                buckets[label] = n
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 2),
+            "mean_ms": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "max_ms": round(self.max, 2),
+            "buckets": buckets,
+        }
+
+
+class MessageStats:
+    """单个 msg_type 的统计"""
+
+    __slots__ = ("latency", "sent", "errors", "timeouts", "late", "bytes_out", "bytes_in")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.sent = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.late = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "late": self.late,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            **self.latency.to_dict(),
+        }
+
+
+class ToolStats:
+    """单个工具（action）的统计"""
+
+    __slots__ = ("latency", "errors")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+
+    def to_dict(self) -> dict:
+        return {"errors": self.errors, **self.latency.to_dict()}
+
+
+class Metrics:
+    """消息与工具指标
+
+    消息生命周期: request() 发出 → response() 收到 / timeout() 超时 → finish() 清理。
+    finish() 时仍未收到响应的请求进入最近放弃列表，之后到达的响应计为迟到。
+
+    字节数按 WebSocket 文本帧长度统计（发出的 JSON 为 ASCII，收到的帧按字符数计）。
+    """
+
+    def __init__(self):
+        # msg_id -> (msg_type, 发出时间)
+        self._inflight: dict[str, tuple] = {}
+        # msg_id -> msg_type，最近被放弃（超时/取消）的请求
+        self._dropped: OrderedDict = OrderedDict()
+        self.reset()
+
+    def reset(self):
+        """清零直方图和计数器；在途和最近放弃的请求保留，之后的响应仍正常归类"""
+        self.started_at = time.time()
+        self.messages: dict[str, MessageStats] = {}
+        self.tools: dict[str, ToolStats] = {}
+        self.late_responses = 0
+        self.unknown_responses = 0
+
+    def _message(self, msg_type: str) -> MessageStats:
+        stats = self.messages.get(msg_type)
+        if stats is None:
+            stats = self.messages[msg_type] = MessageStats()
+        return stats
+
+    def request(self, msg_id: str, msg_type: str, size: int):
+        stats = self._message(msg_type)
+        stats.sent += 1
+        stats.bytes_out += size
+        self._inflight[msg_id] = (msg_type, time.perf_counter())
+
+    def response(self, msg_id: Optional[str], size: int, error: bool = False):
+        entry = self._inflight.pop(msg_id, None)
+        if entry is not None:
+            msg_type, start = entry
+            stats = self._message(msg_type)
+            stats.latency.record((time.perf_counter() - start) * 1000)
+            stats.bytes_in += size
+            if error:
+                stats.errors += 1
+            return
+        msg_type = self._dropped.pop(msg_id, None)
+        if msg_type is not None:
+            self.late_responses += 1
+            stats = self._message(msg_type)
+            stats.late += 1
+            stats.bytes_in += size
+        else:
+            self.unknown_responses += 1
+
+    def timeout(self, msg_id: str):
+        entry = self._inflight.get(msg_id)
+        if entry is not None:
+            self._message(entry[0]).timeouts += 1
+
+    def finish(self, msg_id: str):
+        """请求结束（正常、超时或取消）；未收到响应的请求记入放弃列表"""
+        entry = self._inflight.pop(msg_id, None)
+        if entry is None:
+            return
+        self._dropped[msg_id] = entry[0]
+        if len(self._dropped) > DROPPED_HISTORY:
+            self._dropped.popitem(last=False)
+
+    def record_tool(self, action: str, elapsed: float, success: bool):
+        stats = self.tools.get(action)
+        if stats is None:
+            stats = self.tools[action] = ToolStats()
+        stats.latency.record(elapsed * 1000)
+        if not success:
+            stats.errors += 1
+
+    def snapshot(self) -> dict:
+        """返回统计结果，消息和工具均按累计耗时降序排列"""
+
+        def by_total(items: dict) -> dict:
+            ordered = sorted(items.items(), key=lambda kv: kv[1].latency.total, reverse=True)
+            return {name: stats.to_dict() for name, stats in ordered}
+
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "in_flight": len(self._inflight),
+            "late_responses": self.late_responses,
+            "unknown_responses": self.unknown_responses,
+            "messages": by_total(self.messages),
+            "tools": by_total(self.tools),
+        }
+
+
+class StatsDumper:
+    """定期将统计结果以 JSONL 追加写入文件
+
+    Args:
+        path: 输出文件路径
+        collect: 返回当前统计 dict 的函数
+        interval: 写入间隔（秒）
+    """
+
+    def __init__(self, path: str, collect: Callable[[], dict], interval: float = DEFAULT_STATS_INTERVAL):
+        self.path = Path(path)
+        self.collect = collect
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """停止定时写入，并写入最后一条记录"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.dump()
+
+    def dump(self):
+        record = {"ts": round(time.time(), 3), **self.collect()}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.dump()
+            except OSError:
+                pass
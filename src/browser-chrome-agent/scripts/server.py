@@ -11,6 +11,15 @@ Browser Chrome Agent - WebSocket 服务器
   # 单次命令模式
   python3 server.py --action navigate --params '{"url": "https://example.com"}'
 
+  # 流水线模式（命令并发执行，响应按 id 标记、可能乱序返回）
+  python3 server.py --pipeline --max-concurrency 8
+
+  # 守护进程模式（保持扩展连接，通过本地 socket 接收命令，配合 client.py 使用）
+  python3 server.py --daemon --port 9009
+  python3 client.py --action get_text
+
+  单次命令模式下若同端口的守护进程正在运行，命令会直接转发给它，不再重启服务器。
+
 交互模式协议:
   输入（stdin，每行一个 JSON）:
     {"action": "navigate", "params": {"url": "https://example.com"}}
@@ -22,7 +31,20 @@ Browser Chrome Agent - WebSocket 服务器
 
   特殊命令:
     {"action": "status"}  - 查询连接状态
+    {"action": "run_steps", "params": {"steps": [...]}}  - 在服务器内依次执行多个工具（见 steps.py）
+    {"action": "stats"}   - 查询各消息类型/工具的延迟、字节数、超时等指标（params.reset 为 true 时查询后清零）
     {"action": "quit"}    - 退出服务器
+
+流水线模式协议（--pipeline）:
+  每条命令携带客户端 id，作为独立任务调度，最多同时执行 --max-concurrency 条:
+    {"id": "c1", "action": "get_html", "params": {"savePath": "/tmp/a.html"}}
+    {"id": "c2", "action": "find_element", "params": {"keyword": "搜索"}}
+
+  响应带回同一 id，按完成顺序输出（可能乱序）:
+    {"id": "c2", "success": true, "data": {...}}
+    {"id": "c1", "success": true, "data": {...}}
+
+  quit 会等待所有已提交的命令完成后再退出。
 """
 
 # === 依赖加载 ===
@@ -47,14 +69,26 @@ sys.path.insert(0, str(Path(__file__).parent))
 import argparse
 import asyncio
 import json
+import os
+import time
 
 import websockets
 
-from context import Context
-from tools import TOOLS
+import client
+import executor
+from context import HANDSHAKE_TYPES, ContextPool
+from control import ControlServer, FairScheduler
+from steps import run_steps
+from metrics import DEFAULT_STATS_INTERVAL, StatsDumper
+from tools import MUTATING_TOOLS, PREFETCH_SNAPSHOT, PREFETCH_TOOLS, TAB_TOOLS, TOOLS, prefetch_page_state
 from utils import is_port_in_use, kill_process_on_port
 
 DEFAULT_PORT = 9009
+DEFAULT_MAX_CONCURRENCY = 8
+# 守护进程模式下，工具命令等待扩展连接的最长秒数
+DAEMON_CONNECT_WAIT = 30.0
+# 需要浏览器连接、占用调度名额的命令
+BROWSER_ACTIONS = {*TOOLS, "run_steps"}
 
 
 def output(data: dict):
@@ -75,60 +109,190 @@ def log(msg: str):
     print(msg, file=sys.stderr, flush=True)
 
 
-async def handle_extension(websocket, context: Context):
+async def handle_extension(websocket, pool: ContextPool):
     """处理 Chrome 扩展的 WebSocket 连接"""
-    if context.has_ws():
-        log("[server] 新连接到达，关闭旧连接")
-        await context.close()
-
-    context.ws = websocket
-    log("[server] Chrome 扩展已连接")
+    name = pool.name_from_path(websocket.request.path if websocket.request else "")
+    if name in pool.contexts:
+        log(f"[server] 浏览器 {name} 的新连接到达，关闭旧连接")
+    context = await pool.attach(name, websocket)
+    log(f"[server] Chrome 扩展已连接: {name}（共 {len(pool)} 个）")
 
     try:
         async for message in websocket:
             try:
-                data = json.loads(message)
-                context.handle_response(data)
+                # 大消息（HTML、快照、截图）在执行器中解码，避免阻塞事件循环
+                data = await executor.run_cpu(json.loads, message, size=len(message))
+                if data.get("type") in HANDSHAKE_TYPES:
+                    browser_id = str((data.get("payload") or {}).get("browserId") or "").strip()
+                    if browser_id and browser_id != context.name:
+                        log(f"[server] 连接 {context.name} 握手，名称改为 {browser_id}")
+                        await pool.rename(context, browser_id)
+                    continue
+                context.handle_response(data, size=len(message))
             except json.JSONDecodeError:
                 log(f"[server] 收到无效 JSON: {message[:100]}")
     except websockets.exceptions.ConnectionClosed:
         pass
     finally:
         if context._ws is websocket:
-            context._ws = None
-            log("[server] Chrome 扩展已断开")
-
-
-async def execute_command(context: Context, action: str, params: dict) -> dict:
-    """执行浏览器命令"""
+            log(f"[server] Chrome 扩展已断开: {context.name}")
+        pool.detach(context, websocket)
+
+
+def collect_stats(pool: ContextPool) -> dict:
+    """汇总消息/工具指标与各浏览器的缓存命中情况"""
+    return {
+        **pool.metrics.snapshot(),
+        "cache": {
+            name: {
+                "page": {
+                    "hits": sum(cache.hits for cache in ctx.page_caches.values()),
+                    "misses": sum(cache.misses for cache in ctx.page_caches.values()),
+                    "joins": sum(cache.joins for cache in ctx.page_caches.values()),
+                },
+                "dom": {
+                    "hits": ctx.dom_cache.hits,
+                    "misses": ctx.dom_cache.misses,
+                    "bytes": ctx.dom_cache.total_bytes,
+                },
+            }
+            for name, ctx in pool.contexts.items()
+        },
+    }
+
+
+async def execute_command(pool: ContextPool, action: str, params: dict) -> dict:
+    """执行浏览器命令
+
+    params.browser 指定执行命令的浏览器，未指定时路由到负载最低的健康连接。
+    params.tabId 指定执行命令的标签页，未指定时作用于当前标签页。
+    连接多个浏览器时，响应附带 browser 字段标明实际执行的浏览器。
+    """
     # 特殊命令
     if action == "status":
         return {
             "success": True,
-            "data": {"connected": context.has_ws()},
+            "data": {
+                "connected": pool.has_ws(),
+                "browsers": [ctx.health() for ctx in pool.contexts.values()],
+                "loop_lag": executor.lag_monitor.snapshot(),
+            },
         }
+    if action == "stats":
+        data = collect_stats(pool)
+        if params.get("reset"):
+            pool.metrics.reset()
+            for ctx in pool.contexts.values():
+                for cache in (*ctx.page_caches.values(), ctx.dom_cache):
+                    cache.hits = cache.misses = 0
+                for cache in ctx.page_caches.values():
+                    cache.joins = 0
+        return {"success": True, "data": data}
     if action == "quit":
         return {"success": True, "data": {"message": "服务器关闭中..."}}
 
+    if action == "run_steps":
+        return await execute_steps(pool, params)
+
     # 查找工具
     tool_fn = TOOLS.get(action)
     if not tool_fn:
         available = ", ".join(sorted(TOOLS.keys()))
         return {"success": False, "error": f"未知操作: {action}。可用操作: {available}"}
 
-    # 检查连接
-    if not context.has_ws():
-        return {"success": False, "error": "未连接到浏览器扩展。请先点击扩展图标并连接。"}
+    # 选择连接
+    try:
+        context = pool.select(params.get("browser"))
+    except ConnectionError as e:
+        return {"success": False, "error": str(e)}
+
+    # params.tabId 指定执行命令的标签页（标签页管理工具除外），由调度器按需切换
+    tab_id = None if action in TAB_TOOLS else params.get("tabId")
 
+    context.active_commands += 1
+    start = time.perf_counter()
     try:
-        result = await tool_fn(context, params)
-        return result
+        async with context.tabs.use(tab_id, exclusive=action in TAB_TOOLS):
+            # 会改变页面的操作前后都使页面缓存失效（在切换到目标标签页之后），
+            # 与之并发的读取取到的可能是操作前的页面，不写入缓存
+            if action in MUTATING_TOOLS:
+                with context.page_mutation():
+                    result = await tool_fn(context, params)
+            else:
+                result = await tool_fn(context, params)
     except Exception as e:
+        result = {"success": False, "error": str(e)}
+    finally:
+        context.active_commands -= 1
+    pool.metrics.record_tool(action, time.perf_counter() - start, result.get("success", False))
+    if result.get("success") and action in PREFETCH_TOOLS and params.get("prefetch", pool.prefetch):
+        context.spawn(prefetch_snapshot(context))
+    if len(pool) > 1:
+        result = {**result, "browser": context.name}
+    return result
+
+
+async def prefetch_snapshot(context):
+    """后台预取当前标签页的快照，下一条读取命令直接命中缓存或等待这次获取
+
+    预取期间占用当前标签页（与普通命令并发），避免中途切换标签页后把快照写错缓存。
+    """
+    try:
+        async with context.tabs.use():
+            await prefetch_page_state(context)
+    except Exception as e:
+        log(f"[server] 快照预取失败（{context.name}）: {e}")
+
+
+async def execute_steps(pool: ContextPool, params: dict) -> dict:
+    """run_steps：在同一浏览器上依次执行 params.steps
+
+    params.tabId 作为各步骤（标签页管理工具除外）的默认 tabId。
+    """
+    try:
+        context = pool.select(params.get("browser"))
+    except ConnectionError as e:
         return {"success": False, "error": str(e)}
+    tab_id = params.get("tabId")
+
+    async def execute_step(action: str, step_params: dict) -> dict:
+        if action not in TOOLS:
+            return {"success": False, "error": f"run_steps 中不支持操作: {action}"}
+        step_params = {**step_params, "browser": context.name}
+        if tab_id is not None and action not in TAB_TOOLS:
+            step_params.setdefault("tabId", tab_id)
+        return await execute_command(pool, action, step_params)
+
+    start = time.perf_counter()
+    result = await run_steps(params.get("steps"), execute_step)
+    pool.metrics.record_tool("run_steps", time.perf_counter() - start, result.get("success", False))
+    return result
+
+
+async def run_scheduled(pool: ContextPool, scheduler: FairScheduler, client_id: str, action: str, params: dict) -> dict:
+    """经公平调度执行命令：工具命令占用调度名额，status/stats 等特殊命令直接执行"""
+    if action not in BROWSER_ACTIONS:
+        result = await execute_command(pool, action, params)
+        if action == "status":
+            result["data"]["scheduler"] = {
+                "running": scheduler.running,
+                "max_concurrency": scheduler.max_concurrency,
+                "queued": scheduler.queued,
+            }
+        return result
+    async with scheduler.slot(client_id):
+        return await execute_command(pool, action, params)
+
 
+async def stdin_reader(pool: ContextPool, scheduler: FairScheduler, pipeline: bool = False):
+    """从 stdin 读取 JSON 命令并执行（交互模式）
 
-async def stdin_reader(context: Context):
-    """从 stdin 读取 JSON 命令并执行（交互模式）"""
+    Args:
+        pool: 浏览器连接池
+        scheduler: 与控制 socket 客户端共享的调度器，限制同时执行的命令数
+        pipeline: 为 True 时启用流水线模式，每条命令作为独立任务并发执行，
+            响应带上命令的 id 并按完成顺序输出
+    """
     # 关闭终端回显，避免 tmux send-keys 的输入被回显到 pane
     # 这样 pane 中只有 server.py 主动输出的内容
     import termios
@@ -154,7 +318,24 @@ async def stdin_reader(context: Context):
     # 我们需要识别并在命令完成后将 marker 回显到 stderr（tmux pane 可见）
     pending_marker_id = None  # 当前活跃的 marker ID（如 __CMD_1770870023391__）
 
+    # 流水线模式：in_flight 跟踪未完成的任务，并发数由调度器限制
+    in_flight: set[asyncio.Task] = set()
+
+    async def run_pipelined(cmd_id, action: str, params: dict, marker_id):
+        try:
+            result = await run_scheduled(pool, scheduler, "stdin", action, params)
+        except Exception as e:
+            result = {"success": False, "error": f"内部错误: {e}"}
+        output({"id": cmd_id, **result})
+        if marker_id:
+            log(f"{marker_id}_END")
+
+    if pipeline:
+        log(f"[server] 流水线模式已启用（最大并发 {scheduler.max_concurrency}）")
+
     while True:
+        # 流水线模式下每条响应（包括内部错误）都带上命令的 id
+        cmd_id = None
         try:
             line = await reader.readline()
             if not line:
@@ -186,10 +367,31 @@ async def stdin_reader(context: Context):
                 # 静默忽略非 JSON 行
                 continue
 
+            if isinstance(cmd, dict):
+                cmd_id = cmd.get("id")
             action = cmd.get("action", "")
             params = cmd.get("params", {})
 
-            result = await execute_command(context, action, params)
+            if pipeline:
+                if action == "quit":
+                    # 等待已提交的命令全部完成后再退出
+                    if in_flight:
+                        await asyncio.gather(*in_flight, return_exceptions=True)
+                    result = await execute_command(pool, action, params)
+                    output({"id": cmd_id, **result})
+                    if pending_marker_id:
+                        log(f"{pending_marker_id}_END")
+                        pending_marker_id = None
+                    break
+                task = asyncio.create_task(
+                    run_pipelined(cmd_id, action, params, pending_marker_id)
+                )
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                pending_marker_id = None
+                continue
+
+            result = await run_scheduled(pool, scheduler, "stdin", action, params)
             output(result)
 
             # 命令完成后回显 END marker，让持久终端的 exec 能检测到完成
@@ -201,15 +403,79 @@ async def stdin_reader(context: Context):
                 break
 
         except Exception as e:
-            output({"success": False, "error": f"内部错误: {e}"})
+            error = {"success": False, "error": f"内部错误: {e}"}
+            output({"id": cmd_id, **error} if pipeline else error)
             if pending_marker_id:
                 log(f"{pending_marker_id}_END")
                 pending_marker_id = None
 
+    # stdin 关闭时等待剩余的流水线任务
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+def make_control_handler(pool: ContextPool, scheduler: FairScheduler, stop: asyncio.Event = None):
+    """控制 socket 的命令处理函数
+
+    Args:
+        stop: 守护进程模式下传入，收到 quit 时置位以关闭服务器
+    """
 
-async def run_server(port: int, action: str = None, params: dict = None):
+    async def handle(cmd: dict, client_id: str) -> dict:
+        action = cmd.get("action", "")
+        params = cmd.get("params") or {}
+        if stop is not None and action in BROWSER_ACTIONS and not pool.has_ws():
+            # 守护进程刚启动时扩展可能还在重连
+            await pool.wait_connected(DAEMON_CONNECT_WAIT)
+        result = await run_scheduled(pool, scheduler, client_id, action, params)
+        if action == "quit" and stop is not None:
+            stop.set()
+        return result
+
+    return handle
+
+
+async def run_daemon(pool: ContextPool, scheduler: FairScheduler, socket_path: str):
+    """守护进程模式：在控制 socket 上接收命令，直到收到 quit 或 SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        import signal
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+    except (ImportError, NotImplementedError):
+        pass
+
+    server = ControlServer(socket_path, make_control_handler(pool, scheduler, stop))
+    await server.start()
+    log(f"[server] 守护进程就绪，控制 socket: {socket_path}")
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+
+
+async def run_server(
+    port: int,
+    action: str = None,
+    params: dict = None,
+    pipeline: bool = False,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    stats_file: str = None,
+    stats_interval: float = DEFAULT_STATS_INTERVAL,
+    daemon: bool = False,
+    socket_path: str = None,
+    control_socket: bool = False,
+    prefetch: bool = False,
+):
     """启动 WebSocket 服务器"""
-    context = Context()
+    pool = ContextPool(prefetch=prefetch or PREFETCH_SNAPSHOT)
+    scheduler = FairScheduler(max_concurrency)
+    socket_path = socket_path or client.socket_path(port)
+    executor.lag_monitor.start()
+    dumper = None
+    if stats_file:
+        dumper = StatsDumper(stats_file, lambda: collect_stats(pool), stats_interval)
+        dumper.start()
 
     # 释放端口
     if is_port_in_use(port):
@@ -219,24 +485,41 @@ async def run_server(port: int, action: str = None, params: dict = None):
 
     # 启动 WebSocket 服务器
     async with websockets.serve(
-        lambda ws: handle_extension(ws, context),
+        lambda ws: handle_extension(ws, pool),
         "localhost",
         port,
+        max_size=None,  # 页面 HTML、快照、截图可能超过默认的 1MB 上限
     ) as server:
         log(f"[server] WebSocket 服务器已启动 ws://localhost:{port}")
 
         if action:
             # 单次命令模式：等待扩展连接后执行
             log(f"[server] 单次模式，等待扩展连接后执行: {action}")
-            while not context.has_ws():
-                await asyncio.sleep(0.1)
-            result = await execute_command(context, action, params or {})
+            await pool.wait_connected()
+            result = await execute_command(pool, action, params or {})
             output(result)
+        elif daemon:
+            await run_daemon(pool, scheduler, socket_path)
         else:
-            # 交互模式：从 stdin 读取命令
-            await stdin_reader(context)
-
-    await context.close()
+            # 交互模式：从 stdin 读取命令，可同时开放控制 socket
+            control_server = None
+            if control_socket:
+                control_server = ControlServer(
+                    socket_path, make_control_handler(pool, scheduler), quit_closes_client=True
+                )
+                await control_server.start()
+                log(f"[server] 控制 socket 已开放: {socket_path}")
+            try:
+                await stdin_reader(pool, scheduler, pipeline=pipeline)
+            finally:
+                if control_server is not None:
+                    await control_server.close()
+
+    await pool.close()
+    if dumper is not None:
+        dumper.stop()
+    executor.lag_monitor.stop()
+    executor.executor.shutdown()
     log("[server] 服务器已关闭")
 
 
@@ -256,13 +539,84 @@ def parse_args():
         "--params", type=str, default="{}",
         help="操作参数（JSON 字符串）",
     )
+    parser.add_argument(
+        "--executor", choices=["thread", "process"], default="thread",
+        help="CPU 密集任务执行方式：thread（线程池，默认）或 process（大快照解析使用进程池）",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=executor.DEFAULT_WORKERS,
+        help=f"执行器工作者数量（默认: {executor.DEFAULT_WORKERS}）",
+    )
+    parser.add_argument(
+        "--process-threshold", type=int, default=executor.DEFAULT_PROCESS_THRESHOLD,
+        help=f"process 模式下使用进程池的最小数据量（字节，默认: {executor.DEFAULT_PROCESS_THRESHOLD}）",
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="流水线模式：stdin 命令携带 id 并发执行，响应按 id 标记、可能乱序返回",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+        help=f"同时执行的最大命令数，stdin 与控制 socket 客户端共享（默认: {DEFAULT_MAX_CONCURRENCY}）",
+    )
+    parser.add_argument(
+        "--stats-file", type=str, default=None,
+        help="定期将运行指标（同 stats 命令）以 JSONL 追加写入该文件",
+    )
+    parser.add_argument(
+        "--stats-interval", type=float, default=DEFAULT_STATS_INTERVAL,
+        help=f"--stats-file 的写入间隔（秒，默认: {DEFAULT_STATS_INTERVAL:g}）",
+    )
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="守护进程模式：不读 stdin，通过本地 socket 接收命令（配合 client.py）",
+    )
+    parser.add_argument(
+        "--socket", type=str, default=None,
+        help="控制 socket 路径（默认按端口放在临时目录）",
+    )
+    parser.add_argument(
+        "--control-socket", action="store_true",
+        help="交互模式下同时开放控制 socket，允许多个本地客户端并发发送命令",
+    )
+    parser.add_argument(
+        "--prefetch", action="store_true",
+        help="导航、点击等操作完成后在后台预取快照，随后的查找命令无需等待快照（也可在 config.json 中设置 prefetch_snapshot）",
+    )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
     params = json.loads(args.params) if args.params else {}
+    if (args.daemon or args.control_socket) and not client.SUPPORTS_UNIX_SOCKET:
+        log("[server] 当前平台不支持 Unix socket，无法使用 --daemon / --control-socket")
+        sys.exit(1)
+    if args.action and not args.daemon and client.SUPPORTS_UNIX_SOCKET:
+        # 同端口的守护进程正在运行时直接转发，避免重启服务器和扩展重连
+        path = args.socket or client.socket_path(args.port)
+        try:
+            client.connect(path, timeout=1).close()
+        except OSError:
+            pass
+        else:
+            try:
+                output(client.send_command(path, args.action, params, timeout=None))
+            except (OSError, ValueError) as e:
+                output({"success": False, "error": str(e)})
+            sys.exit(0)
+    executor.configure(args.executor, args.workers, args.process_threshold)
     try:
-        asyncio.run(run_server(args.port, args.action, params))
+        asyncio.run(run_server(
+            args.port, args.action, params,
+            pipeline=args.pipeline,
+            max_concurrency=args.max_concurrency,
+            stats_file=args.stats_file,
+            stats_interval=args.stats_interval,
+            daemon=args.daemon,
+            socket_path=args.socket,
+            control_socket=args.control_socket,
+            prefetch=args.prefetch,
+        ))
     except KeyboardInterrupt:
         log("\n[server] 已停止")
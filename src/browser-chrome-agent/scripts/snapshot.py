@@ -0,0 +1,530 @@
+"""
+ARIA 快照解析
+
+将扩展返回的 YAML 格式 ARIA 快照一次性解析为紧凑的节点树，
+供 find_element / find_and_locate / get_text 等工具共享查询。
+
+快照格式示例:
+    - generic [ref=s1e2]:
+      - heading "Example Domain" [level=1] [ref=s1e3]
+      - paragraph [ref=s1e4]: This domain is for use in examples.
+      - link "More information..." [ref=s1e5]:
+        - /url: https://www.iana.org/domains/example
+      - text: hello
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import heapq
+import json
+import re
+from array import array
+from collections import Counter
+from typing import Optional
+
+# 键部分: 角色 + 可选名称（JSON 字符串或 /正则/）+ 若干 [属性]
+_KEY_RE = re.compile(r'^(\S+)(?: ("(?:[^"\\]|\\.)*"|/.*/))?((?: \[[^\]]*\])*)$')
+_ATTR_RE = re.compile(r'\[([^\]=]+)(?:=([^\]]*))?\]')
+_GENERATION_RE = re.compile(r'\[ref=s(\d+)e\d+\]')
+_REF_ATTR_RE = re.compile(r' \[ref=[^\]]*\]')
+
+# get_text 中视为无意义的分隔文本
+_NOISE_TEXTS = {"|", "-", "·"}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# 搜索评分：完全匹配 > 前缀 > 整词 > 子串 > 模糊
+SCORE_EXACT = 100.0
+SCORE_PREFIX = 70.0
+SCORE_TOKEN = 50.0
+SCORE_SUBSTRING = 40.0
+SCORE_FUZZY = 25.0
+# 命中的是元素内联文本而非名称时的折扣
+TEXT_FIELD_WEIGHT = 0.6
+# 模糊匹配的最低 Dice 相似度（基于字符二元组）
+FUZZY_THRESHOLD = 0.5
+
+# 可交互角色的加权，让按钮、链接、输入框排在同名的普通元素之前
+ROLE_WEIGHTS = {
+    "button": 1.5,
+    "textbox": 1.5,
+    "searchbox": 1.5,
+    "link": 1.4,
+    "combobox": 1.4,
+    "checkbox": 1.3,
+    "radio": 1.3,
+    "switch": 1.3,
+    "menuitem": 1.3,
+    "tab": 1.3,
+    "option": 1.2,
+    "heading": 1.1,
+}
+
+
+class SnapshotNode:
+    """快照中的一个节点（元素或文本）
+
+    parent 为父节点在 AriaSnapshot.nodes 中的下标，顶层节点为 -1。
+    attrs 中 [level=1] 等属性以原名保存，- /url: 等属性行以 "/url" 形式保存。
+    """
+
+    __slots__ = ("index", "role", "name", "ref", "depth", "parent", "text", "attrs")
+
+    def __init__(
+        self,
+        index: int,
+        role: str,
+        name: str = "",
+        ref: str = "",
+        depth: int = 0,
+        parent: int = -1,
+        text: str = "",
+        attrs: Optional[dict] = None,
+    ):
+        self.index = index
+        self.role = role
+        self.name = name
+        self.ref = ref
+        self.depth = depth
+        self.parent = parent
+        self.text = text
+        self.attrs = attrs
+
+    def to_dict(self) -> dict:
+        """转为 find_element 等工具使用的匹配结果格式"""
+        return {"ref": self.ref, "type": self.role, "text": self.name or self.text}
+
+    def render(self, indent: str = "", with_ref: bool = True, has_children: bool = False) -> list:
+        """还原为快照格式的行（含 /url 等属性行）"""
+        if self.role == "text":
+            return [f"{indent}- text: {self.text}"]
+        key = self.role
+        if self.name:
+            key += " " + json.dumps(self.name, ensure_ascii=False)
+        props = []
+        for attr_name, attr_value in (self.attrs or {}).items():
+            if attr_name.startswith("/"):
+                props.append(f"{indent}  - {attr_name}: {attr_value}")
+            elif attr_value is True:
+                key += f" [{attr_name}]"
+            else:
+                key += f" [{attr_name}={attr_value}]"
+        if with_ref and self.ref:
+            key += f" [ref={self.ref}]"
+        line = f"{indent}- {key}"
+        if self.text:
+            line += f": {self.text}"
+        elif props or has_children:
+            line += ":"
+        return [line] + props
+
+    def __repr__(self):
+        return f"SnapshotNode({self.role!r}, {self.name!r}, ref={self.ref!r})"
+
+
+class AriaSnapshot:
+    """解析后的 ARIA 快照
+
+    Attributes:
+        raw: 原始快照文本
+        nodes: 按文档顺序排列的节点列表
+        generation: ref 的代数（s<N>e 中的 N），无 ref 时为 0
+    """
+
+    __slots__ = ("raw", "nodes", "generation", "_index")
+
+    def __init__(self, raw: str, nodes: list, generation: int = 0):
+        self.raw = raw
+        self.nodes = nodes
+        self.generation = generation
+        self._index = None
+
+    @property
+    def index(self) -> "SnapshotIndex":
+        """元素搜索索引，首次访问时构建，随快照一起缓存"""
+        if self._index is None:
+            self._index = SnapshotIndex(self)
+        return self._index
+
+    def fingerprint(self) -> int:
+        """与 ref 无关的内容指纹：每次快照 ref 代数都会变化，比较页面是否变化时需去掉 ref"""
+        return hash(_REF_ATTR_RE.sub("", self.raw))
+
+    def texts(self) -> list:
+        """按文档顺序提取页面可见文字（已去重）"""
+        seen = set()
+        lines = []
+        for node in self.nodes:
+            if node.role == "text":
+                candidates = (node.text,)
+            elif node.ref:
+                candidates = (node.name if len(node.name) > 1 else "", node.text)
+            else:
+                continue
+            for text in candidates:
+                text = text.strip()
+                if text and text not in _NOISE_TEXTS and text not in seen:
+                    seen.add(text)
+                    lines.append(text)
+        return lines
+
+
+def _bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SnapshotIndex:
+    """带 ref 元素的倒排索引（整词 + 字符二元组），支持排序与模糊搜索
+
+    二元组对中文等无空格分词的文本同样有效。
+    """
+
+    __slots__ = ("nodes", "names", "texts", "tokens", "grams")
+
+    def __init__(self, tree: AriaSnapshot):
+        self.nodes = [node for node in tree.nodes if node.ref and (node.name or node.text)]
+        self.names = [node.name.lower() for node in self.nodes]
+        self.texts = [node.text.lower() for node in self.nodes]
+        self.tokens: dict = {}
+        self.grams: dict = {}
+        for pos, (name, text) in enumerate(zip(self.names, self.texts)):
+            for token in set(_TOKEN_RE.findall(name)) | set(_TOKEN_RE.findall(text)):
+                self.tokens.setdefault(token, array("I")).append(pos)
+            for gram in _bigrams(name) | _bigrams(text):
+                self.grams.setdefault(gram, array("I")).append(pos)
+
+    def _score_one(self, keyword: str, case_sensitive: bool, fuzzy: bool) -> tuple:
+        """单个关键字的评分，返回 ({位置: 分数}, 模糊命中的位置集合)"""
+        query = keyword.lower().strip()
+        fuzzy_hits: set = set()
+        if not query:
+            return {}, fuzzy_hits
+        q_tokens = set(_TOKEN_RE.findall(query))
+        q_grams = _bigrams(query)
+
+        # 包含全部查询词（整词）的元素
+        token_hits: set = set()
+        if q_tokens:
+            postings = [self.tokens.get(token) for token in q_tokens]
+            if None not in postings:
+                postings.sort(key=len)
+                token_hits = set(postings[0])
+                for posting in postings[1:]:
+                    token_hits.intersection_update(posting)
+
+        # 候选集：最短的二元组倒排表（子串匹配的必要条件）；单字符查询退化为全量扫描
+        if q_grams:
+            postings = [self.grams.get(gram) for gram in q_grams]
+            candidates = range(0) if None in postings else min(postings, key=len)
+        else:
+            candidates = range(len(self.nodes))
+
+        stripped = keyword.strip()
+        scores = {}
+        for pos in candidates:
+            best = 0.0
+            for field, weight in ((self.names[pos], 1.0), (self.texts[pos], TEXT_FIELD_WEIGHT)):
+                if not field or query not in field:
+                    continue
+                if case_sensitive:
+                    original = self.nodes[pos].name if weight == 1.0 else self.nodes[pos].text
+                    if stripped not in original:
+                        continue
+                if field == query:
+                    score = SCORE_EXACT
+                elif field.startswith(query):
+                    score = SCORE_PREFIX
+                elif pos in token_hits:
+                    score = SCORE_TOKEN
+                else:
+                    score = SCORE_SUBSTRING
+                best = max(best, score * weight)
+            if best:
+                scores[pos] = best
+
+        # 词序不同但全部整词命中（如 "in sign" 匹配 "Sign in"）
+        if len(q_tokens) > 1 and not case_sensitive:
+            for pos in token_hits:
+                if pos not in scores:
+                    scores[pos] = SCORE_TOKEN * 0.8
+
+        # 模糊匹配：按共享二元组数计算 Dice 相似度
+        if fuzzy and not case_sensitive and q_grams:
+            shared = Counter()
+            for gram in q_grams:
+                posting = self.grams.get(gram)
+                if posting is not None:
+                    shared.update(posting)
+            for pos, count in shared.items():
+                if pos in scores:
+                    continue
+                name = self.names[pos] or self.texts[pos]
+                similarity = 2 * count / (len(q_grams) + len(_bigrams(name)))
+                if similarity >= FUZZY_THRESHOLD:
+                    scores[pos] = SCORE_FUZZY * min(similarity, 1.0)
+                    fuzzy_hits.add(pos)
+        return scores, fuzzy_hits
+
+    def search(
+        self,
+        keywords,
+        mode: str = "all",
+        case_sensitive: bool = False,
+        fuzzy: Optional[bool] = None,
+        limit: int = 0,
+    ) -> list:
+        """排序搜索
+
+        Args:
+            keywords: 关键字字符串或列表
+            mode: 多关键字时 "all"（全部命中）或 "any"（任一命中）
+            case_sensitive: 是否区分大小写（区分时不做模糊匹配）
+            fuzzy: 是否启用模糊匹配。None 表示仅在没有直接命中时启用
+            limit: 最大返回数量，0 表示不限
+
+        Returns:
+            [(节点, 分数, 是否模糊命中), ...]，按分数降序、文档顺序升序排列
+        """
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        keywords = [k for k in keywords if k and k.strip()]
+        if not keywords:
+            return []
+
+        def combine(per_keyword: list) -> tuple:
+            fuzzy_hits = set().union(*(hits for _, hits in per_keyword))
+            if mode == "any":
+                total: dict = {}
+                for scores, _ in per_keyword:
+                    for pos, score in scores.items():
+                        total[pos] = total.get(pos, 0.0) + score
+                return total, fuzzy_hits
+            common = set(per_keyword[0][0])
+            for scores, _ in per_keyword[1:]:
+                common.intersection_update(scores)
+            return {pos: sum(scores[pos] for scores, _ in per_keyword) for pos in common}, fuzzy_hits
+
+        total, fuzzy_hits = combine([self._score_one(k, case_sensitive, bool(fuzzy)) for k in keywords])
+        if not total and fuzzy is None and not case_sensitive:
+            total, fuzzy_hits = combine([self._score_one(k, case_sensitive, True) for k in keywords])
+
+        ranked = []
+        for pos, score in total.items():
+            node = self.nodes[pos]
+            ranked.append((node, round(score * ROLE_WEIGHTS.get(node.role, 1.0), 2), pos in fuzzy_hits))
+        key = lambda item: (-item[1], item[0].index)
+        if limit:
+            return heapq.nsmallest(limit, ranked, key=key)
+        ranked.sort(key=key)
+        return ranked
+
+
+class SnapshotDiff:
+    """两份快照之间的增量：新增、删除、变化的节点
+
+    节点身份由祖先链上的 (角色, 名称, 同名兄弟序号) 决定，与每次递增的 ref 前缀无关。
+    """
+
+    __slots__ = ("base", "current", "added", "removed", "changed")
+
+    def __init__(self, base: AriaSnapshot, current: AriaSnapshot):
+        self.base = base
+        self.current = current
+        self.added: list = []
+        self.removed: list = []
+        # [(旧节点, 新节点), ...]
+        self.changed: list = []
+
+    def size(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def summary(self) -> str:
+        return f"+{len(self.added)} -{len(self.removed)} ~{len(self.changed)}"
+
+    def _context_line(self, tree: AriaSnapshot, node: SnapshotNode) -> str:
+        if node.parent < 0:
+            return "# in: (root)"
+        parent = tree.nodes[node.parent]
+        return "# in: " + parent.render(with_ref=(tree is self.current))[0][2:].rstrip(":")
+
+    def to_text(self) -> str:
+        """渲染为带注释的快照格式文本；新增/变化节点使用最新 ref"""
+        lines = [f"# diff s{self.base.generation}e -> s{self.current.generation}e: {self.summary()}"]
+        for title, nodes, tree in (
+            ("added", self.added, self.current),
+            ("removed", self.removed, self.base),
+        ):
+            if not nodes:
+                continue
+            lines.append(f"# {title} ({len(nodes)})")
+            in_set = {node.index for node in nodes}
+            parents = {node.parent for node in nodes}
+            for node in nodes:
+                # 子树根节点先输出其所在位置，子节点按相对缩进输出
+                if node.parent not in in_set:
+                    root_depth = node.depth
+                    lines.append(self._context_line(tree, node))
+                indent = "  " * max(node.depth - root_depth, 0)
+                lines.extend(node.render(
+                    indent,
+                    with_ref=(tree is self.current),
+                    has_children=node.index in parents,
+                ))
+        if self.changed:
+            lines.append(f"# changed ({len(self.changed)})")
+            for old, new in self.changed:
+                lines.extend(new.render())
+                was = old.render(with_ref=False)[0][2:].rstrip(":")
+                lines.append(f"  # was: {was}")
+        return "\n".join(lines)
+
+
+def _identity_keys(tree: AriaSnapshot) -> dict:
+    """为每个节点计算与 ref 无关的稳定身份 {key: 节点}"""
+    keys: list = [None] * len(tree.nodes)
+    counters: dict = {}
+    result = {}
+    for node in tree.nodes:
+        parent_key = keys[node.parent] if node.parent >= 0 else ()
+        slot = (node.parent, node.role, node.name)
+        occurrence = counters.get(slot, 0)
+        counters[slot] = occurrence + 1
+        key = (parent_key, node.role, node.name, occurrence)
+        keys[node.index] = key
+        result[key] = node
+    return result
+
+
+def diff_snapshots(base: AriaSnapshot, current: AriaSnapshot) -> SnapshotDiff:
+    """比较两份快照，按角色/名称路径匹配节点"""
+    diff = SnapshotDiff(base, current)
+    old_keys = _identity_keys(base)
+    new_keys = _identity_keys(current)
+    for key, node in new_keys.items():
+        old = old_keys.get(key)
+        if old is None:
+            diff.added.append(node)
+        elif old.text != node.text or old.attrs != node.attrs:
+            diff.changed.append((old, node))
+    for key, node in old_keys.items():
+        if key not in new_keys:
+            diff.removed.append(node)
+    return diff
+
+
+def _unquote_name(token: str) -> str:
+    if token.startswith('"'):
+        if "\\" not in token:
+            return token[1:-1]
+        try:
+            return json.loads(token)
+        except ValueError:
+            return token[1:-1]
+    return token
+
+
+def _unquote_value(value: str) -> str:
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return _unquote_name(value)
+    return value
+
+
+def _split_entry(body: str) -> tuple:
+    """拆分一行的键和值，返回 (key, has_children, inline_value)"""
+    if body.startswith("'"):
+        # 整个键被 YAML 单引号包裹，'' 表示转义的单引号
+        i = 1
+        while True:
+            i = body.find("'", i)
+            if i == -1:
+                return body[1:], False, ""
+            if body.startswith("''", i):
+                i += 2
+                continue
+            break
+        key = body[1:i].replace("''", "'")
+        rest = body[i + 1:]
+    else:
+        sep = body.find(": ")
+        if sep == -1:
+            if body.endswith(":"):
+                return body[:-1], True, ""
+            return body, False, ""
+        key, rest = body[:sep], body[sep:]
+
+    if not rest:
+        return key, False, ""
+    if rest == ":":
+        return key, True, ""
+    return key, False, _unquote_value(rest[2:].strip())
+
+
+def parse_snapshot(text: str) -> AriaSnapshot:
+    """单遍解析 ARIA 快照文本，构建节点树"""
+    nodes: list = []
+    # stack[d] 为深度 d 上最近一个节点的下标
+    stack: list = []
+    generation = 0
+
+    for line in text.split("\n"):
+        stripped = line.lstrip(" ")
+        if not stripped.startswith("- "):
+            continue
+        depth = (len(line) - len(stripped)) // 2
+        key, _, value = _split_entry(stripped[2:])
+        del stack[depth:]
+        parent = stack[-1] if stack else -1
+
+        # - /url: ... 等属性行挂到父节点上（键保留 / 前缀以区别于 [属性]）
+        if key.startswith("/"):
+            if parent >= 0:
+                owner = nodes[parent]
+                if owner.attrs is None:
+                    owner.attrs = {}
+                owner.attrs[key] = value
+            continue
+
+        index = len(nodes)
+        if key == "text":
+            node = SnapshotNode(index, "text", depth=depth, parent=parent, text=value)
+        else:
+            m = _KEY_RE.match(key)
+            if m:
+                role, name_token, attr_text = m.groups()
+                name = _unquote_name(name_token) if name_token else ""
+            else:
+                role, name, attr_text = key.split(" ", 1)[0], "", ""
+            ref = ""
+            attrs = None
+            if attr_text:
+                for attr_name, attr_value in _ATTR_RE.findall(attr_text):
+                    if attr_name == "ref":
+                        ref = attr_value
+                    else:
+                        if attrs is None:
+                            attrs = {}
+                        attrs[attr_name] = attr_value if attr_value else True
+                if ref and not generation:
+                    g = _GENERATION_RE.search(attr_text)
+                    if g:
+                        generation = int(g.group(1))
+            node = SnapshotNode(index, role, name, ref, depth, parent, value, attrs)
+
+        nodes.append(node)
+        stack.append(index)
+
+    return AriaSnapshot(text, nodes, generation)
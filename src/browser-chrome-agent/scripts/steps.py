@@ -0,0 +1,227 @@
+"""
+步骤脚本
+
+run_steps 在服务器内依次执行一组工具调用，步骤之间通过变量传递结果，
+省去调用方每一步一次的 stdin/stdout 往返。
+
+变量引用（引用的是步骤结果的 data）:
+  "$prev.matches[0].ref"     上一步
+  "$login.matches[0].ref"    name 为 login 的步骤
+  "$steps[0].text"           第 1 步（按序号）
+  "搜索 ${prev.text} 的结果"  嵌入字符串中（转为文本）
+
+整个字符串就是一个引用时保留原始类型（数字、列表、dict）。
+
+条件:
+  "if": "$prev.matches"      引用值为真才执行，否则跳过
+  "unless": "$prev.matches"  引用值为真则跳过
+
+遇到第一个失败的步骤即停止，返回已执行步骤的结果和每步耗时。
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import re
+import time
+from typing import Any, Awaitable, Callable
+
+MAX_STEPS = 100
+
+_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# 变量根: $prev / $name / $steps[0]，后接 .key 或 [index]
+_REF_PATTERN = r"([A-Za-z_][A-Za-z0-9_]*)((?:\.[A-Za-z_][A-Za-z0-9_]*|\[-?\d+\])*)"
+_WHOLE_RE = re.compile(r"^\$" + _REF_PATTERN + r"$")
+_EMBED_RE = re.compile(r"\$\{" + _REF_PATTERN + r"\}")
+_SEGMENT_RE = re.compile(r"\.([A-Za-z_][A-Za-z0-9_]*)|\[(-?\d+)\]")
+
+_MISSING = object()
+
+
+class StepError(Exception):
+    pass
+
+
+class _Scope:
+    """已执行步骤的结果，供变量解析"""
+
+    def __init__(self):
+        self.prev: Any = None
+        self.steps: list = []
+        self.named: dict = {}
+
+    def lookup(self, root: str, path: str, strict: bool = True) -> Any:
+        if root == "prev":
+            value = self.prev
+        elif root == "steps":
+            value = self.steps
+        elif root in self.named:
+            value = self.named[root]
+        elif strict:
+            raise StepError(f"未定义的变量: ${root}")
+        else:
+            return None
+        for key, index in _SEGMENT_RE.findall(path):
+            if key:
+                value = value.get(key, _MISSING) if isinstance(value, dict) else _MISSING
+            else:
+                i = int(index)
+                value = value[i] if isinstance(value, list) and -len(value) <= i < len(value) else _MISSING
+            if value is _MISSING:
+                if strict:
+                    raise StepError(f"变量 ${root}{path} 不存在")
+                return None
+        return value
+
+    def resolve(self, value: Any) -> Any:
+        """递归替换参数中的变量引用"""
+        if isinstance(value, str):
+            match = _WHOLE_RE.match(value)
+            if match:
+                return self.lookup(match.group(1), match.group(2))
+            if "${" in value:
+                return _EMBED_RE.sub(lambda m: _to_text(self.lookup(m.group(1), m.group(2))), value)
+            return value
+        if isinstance(value, list):
+            return [self.resolve(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.resolve(v) for k, v in value.items()}
+        return value
+
+    def condition(self, expr: Any) -> bool:
+        """条件求值：变量引用取其真值（不存在视为假），其他值直接取真值"""
+        if isinstance(expr, str):
+            match = _WHOLE_RE.match(expr)
+            if match:
+                return bool(self.lookup(match.group(1), match.group(2), strict=False))
+        return bool(expr)
+
+
+def _to_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, dict) and isinstance(value.get("text"), str):
+        return value["text"]
+    return str(value)
+
+
+def validate_steps(steps: Any, nested_action: str = "run_steps") -> list:
+    """检查步骤列表格式，返回规范化后的步骤"""
+    if not isinstance(steps, list) or not steps:
+        raise StepError("steps 必须是非空列表")
+    if len(steps) > MAX_STEPS:
+        raise StepError(f"步骤过多（{len(steps)}），最多 {MAX_STEPS} 步")
+    names = set()
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict) or not isinstance(step.get("action"), str):
+            raise StepError(f"第 {i + 1} 步格式错误，应为 {{\"action\": ..., \"params\": {{...}}}}")
+        if step["action"] == nested_action:
+            raise StepError(f"第 {i + 1} 步不能嵌套 {nested_action}")
+        name = step.get("name")
+        if name is not None:
+            if not isinstance(name, str) or not _NAME_RE.match(name) or name in ("prev", "steps"):
+                raise StepError(f"第 {i + 1} 步的 name 无效: {name!r}")
+            if name in names:
+                raise StepError(f"步骤 name 重复: {name}")
+            names.add(name)
+    return steps
+
+
+async def run_steps(steps: list, execute: Callable[[str, dict], Awaitable[dict]]) -> dict:
+    """依次执行步骤
+
+    Args:
+        steps: [{"action": ..., "params": {...}, "name": ..., "if": ..., "unless": ...}, ...]
+        execute: execute(action, params) -> 工具结果 dict
+
+    Returns:
+        工具格式的结果，data.steps 为每一步的状态、耗时和结果
+    """
+    try:
+        steps = validate_steps(steps)
+    except StepError as e:
+        return {"success": False, "error": str(e)}
+
+    scope = _Scope()
+    records = []
+    failed = None
+    total_start = time.perf_counter()
+
+    for i, step in enumerate(steps):
+        action = step["action"]
+        record = {"index": i + 1, "action": action}
+        if step.get("name"):
+            record["name"] = step["name"]
+        start = time.perf_counter()
+
+        skip = ("if" in step and not scope.condition(step["if"])) or (
+            "unless" in step and scope.condition(step["unless"])
+        )
+        if skip:
+            record["status"] = "skipped"
+            record["elapsed_ms"] = 0.0
+            records.append(record)
+            scope.steps.append(None)
+            continue
+
+        try:
+            result = await execute(action, scope.resolve(step.get("params") or {}))
+        except StepError as e:
+            result = {"success": False, "error": str(e)}
+        except Exception as e:
+            result = {"success": False, "error": f"内部错误: {e}"}
+
+        record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if result.get("success"):
+            data = result.get("data")
+            record["status"] = "ok"
+            record["data"] = data
+            scope.prev = data
+            scope.steps.append(data)
+            if step.get("name"):
+                scope.named[step["name"]] = data
+            records.append(record)
+            continue
+
+        record["status"] = "error"
+        record["error"] = result.get("error", "未知错误")
+        records.append(record)
+        failed = record
+        break
+
+    total_ms = round((time.perf_counter() - total_start) * 1000, 2)
+    lines = [
+        f"[{r['index']}] {r['action']} {r['status']} {r['elapsed_ms']}ms"
+        + (f": {r['error']}" if r["status"] == "error" else "")
+        for r in records
+    ]
+    last_ok = next((r for r in reversed(records) if r["status"] == "ok"), None)
+    if last_ok is not None and isinstance(last_ok.get("data"), dict) and last_ok["data"].get("text"):
+        lines.append("")
+        lines.append(last_ok["data"]["text"])
+    data = {
+        "type": "text",
+        "text": "\n".join(lines),
+        "steps": records,
+        "total_ms": total_ms,
+    }
+    if failed is not None:
+        return {
+            "success": False,
+            "error": f"第 {failed['index']} 步 {failed['action']} 失败: {failed['error']}",
+            "data": data,
+        }
+    return {"success": True, "data": data}
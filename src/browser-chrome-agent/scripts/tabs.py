@@ -0,0 +1,169 @@
+"""
+标签页调度
+
+扩展同一时间只 attach 一个标签页，所有工具都作用于该标签页。TabScheduler 让命令可以
+携带 tabId 指定目标标签页：
+
+- 目标为当前标签页（或未指定）的命令直接并发执行
+- 目标为其他标签页的命令排队，等当前标签页上的命令全部结束后切换一次，
+  并一次性放行队列中所有指向该标签页的命令，减少 detach/attach 次数
+- 携带同一 tabId 的命令按到达顺序逐条执行
+- 标签页管理工具（list_tabs/new_tab/switch_tab/close_tab）独占执行
+
+扩展的 aria ref 按页面保存，切走再切回后仍然有效，因此各标签页的快照缓存互不影响。
+"""
+
+# === 依赖加载 ===
+import sys
+from pathlib import Path
+
+_p = Path(__file__).resolve()
+while _p != _p.parent:
+    if _p.name == "skills":
+        _libloader = _p / ".scripts" / "lib" / "libloader.py"
+        if _libloader.exists():
+            sys.path.insert(0, str(_libloader.parent))
+            from libloader import setup
+            setup()
+        break
+    _p = _p.parent
+# === 依赖加载结束 ===
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any
+
+
+class _Waiter:
+    __slots__ = ("tab_id", "exclusive", "future")
+
+    def __init__(self, tab_id, exclusive: bool, future: asyncio.Future):
+        self.tab_id = tab_id
+        self.exclusive = exclusive
+        self.future = future
+
+
+class TabScheduler:
+    """单个扩展连接的标签页调度器
+
+    Args:
+        context: 所属的 Context，读取/更新其 active_tab_id 并通过它发送切换消息
+    """
+
+    def __init__(self, context):
+        self._context = context
+        # 当前标签页上正在执行的命令数
+        self._holders = 0
+        # 正在独占执行（标签页工具或切换中）
+        self._exclusive = False
+        self._queue: deque = deque()
+        self._tab_locks: dict[Any, asyncio.Lock] = {}
+        self.switches = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _compatible(self, waiter: _Waiter) -> bool:
+        """无需切换即可在当前标签页上执行"""
+        return not waiter.exclusive and (
+            waiter.tab_id is None or waiter.tab_id == self._context.active_tab_id
+        )
+
+    def _wake(self):
+        """按到达顺序放行：兼容的命令加入当前组；需要切换或独占的命令等当前组结束"""
+        while self._queue and not self._exclusive:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                self._queue.popleft()
+                continue
+            if self._compatible(waiter):
+                self._queue.popleft()
+                self._holders += 1
+                waiter.future.set_result(False)
+                continue
+            if self._holders:
+                break
+            self._queue.popleft()
+            self._exclusive = True
+            waiter.future.set_result(True)
+            break
+
+    def _admit_tab(self, tab_id):
+        """切换完成后，放行队列中所有指向该标签页的命令（不论排在哪里）"""
+        remaining = deque()
+        for waiter in self._queue:
+            if not waiter.future.done() and not waiter.exclusive and waiter.tab_id in (tab_id, None):
+                self._holders += 1
+                waiter.future.set_result(False)
+            else:
+                remaining.append(waiter)
+        self._queue = remaining
+
+    async def _acquire(self, tab_id, exclusive: bool) -> bool:
+        """等待轮到执行，返回是否进入独占阶段"""
+        waiter = _Waiter(tab_id, exclusive, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        self._wake()
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已被放行但调用方被取消，归还名额
+                self._release(waiter.future.result())
+            raise
+
+    def _release(self, exclusive: bool):
+        if exclusive:
+            self._exclusive = False
+        else:
+            self._holders -= 1
+        self._wake()
+
+    async def _switch(self, tab_id):
+        await self._context.send_message("browser_switch_tab", {"tabId": tab_id})
+        self._context.active_tab_id = tab_id
+        self.switches += 1
+
+    @asynccontextmanager
+    async def use(self, tab_id=None, exclusive: bool = False):
+        """在目标标签页上执行一条命令
+
+        Args:
+            tab_id: 目标标签页，None 表示当前标签页
+            exclusive: 独占执行（标签页管理工具），期间不执行其他命令
+        """
+        phase_exclusive = await self._acquire(tab_id, exclusive)
+        if phase_exclusive and not exclusive:
+            # 轮到切换：切到目标标签页后转为普通执行，并放行同标签页的排队命令
+            try:
+                await self._switch(tab_id)
+            except BaseException:
+                self._release(True)
+                raise
+            self._exclusive = False
+            self._holders += 1
+            self._admit_tab(tab_id)
+            self._wake()
+            phase_exclusive = False
+        try:
+            if tab_id is not None and not exclusive:
+                async with self._tab_lock(tab_id):
+                    yield
+            else:
+                yield
+        finally:
+            self._release(phase_exclusive)
+
+    def _tab_lock(self, tab_id) -> asyncio.Lock:
+        lock = self._tab_locks.get(tab_id)
+        if lock is None:
+            lock = self._tab_locks[tab_id] = asyncio.Lock()
+        return lock
+
+    def forget(self, tab_id):
+        """标签页关闭后释放其锁"""
+        lock = self._tab_locks.get(tab_id)
+        if lock is not None and not lock.locked():
+            del self._tab_locks[tab_id]
@@ -21,9 +21,16 @@ while _p != _p.parent:
     _p = _p.parent
 # === 依赖加载结束 ===
 
+import asyncio
 import json as _json
+import re
+import threading
+import time
+from functools import lru_cache
 
-from utils import capture_aria_snapshot
+from cache import DEFAULT_DOM_CACHE_MB, DEFAULT_TTL
+from executor import run_cpu
+from utils import capture_aria_snapshot, get_page_state
 
 # === 配置加载 ===
 _config_path = Path(__file__).parent.parent / "config.json"
@@ -35,58 +42,459 @@ if _config_path.exists():
         pass
 
 
+# wait_for 的默认超时与轮询间隔（秒），可在 config.json 中覆盖
+DEFAULT_WAIT_TIMEOUT = 10.0
+DEFAULT_POLL_INTERVAL = 0.1
+DEFAULT_MAX_POLL_INTERVAL = 1.0
+# 点击超时（通常是点击触发了跳转）后等待 URL 变化的最长秒数
+CLICK_NAVIGATION_WAIT = 1.0
+# 导航就绪策略，前三个按页面加载顺序排列，后两个在 load 之后再等待页面稳定
+WAIT_UNTIL = ("commit", "domcontentloaded", "load", "network_idle", "dom_stable")
+# 页面内容保持不变多久（秒）视为稳定，以及最多等待多久
+DEFAULT_STABLE_WINDOW = 0.5
+DEFAULT_STABLE_TIMEOUT = 10.0
+# 交互后的稳定检测方式（见 _settle），以及默认静默窗口与最长等待秒数
+SETTLE_MODES = ("html", "dom", "url", "none")
+DEFAULT_SETTLE_WINDOW = 0.3
+DEFAULT_SETTLE_TIMEOUT = 5.0
+
+
+async def _page_state(context, params: dict):
+    """获取页面状态，params 中 fresh=true 时跳过缓存"""
+    return await get_page_state(
+        context,
+        fresh=params.get("fresh", False),
+        ttl=_config.get("snapshot_cache_ttl", DEFAULT_TTL),
+    )
+
+
+async def prefetch_page_state(context):
+    """预取当前页面快照写入缓存；已有缓存或进行中的获取时不重复获取"""
+    await _page_state(context, {})
+
+
+def _snapshot_diff(params: dict) -> bool:
+    """是否只输出增量快照（params 的 snapshot_diff，默认从 config.json 读取）"""
+    return params.get("snapshot_diff", _config.get("snapshot_diff", False))
+
+
+def _is_stale_ref_error(error: Exception) -> bool:
+    """判断是否为 ref 过期导致的错误（快照代数已变化）"""
+    message = str(error)
+    return "Stale aria-ref" in message or "No snapshot found" in message
+
+
+def _search_keywords(params: dict) -> list:
+    """从 params 中读取 keyword（字符串）或 keywords（列表）"""
+    keywords = params.get("keywords") or params.get("keyword") or []
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    return [k for k in keywords if isinstance(k, str) and k.strip()]
+
+
+def _role_filter(params: dict):
+    """params.role（字符串或列表）转为小写角色集合，未指定时返回 None"""
+    roles = params.get("role")
+    if not roles:
+        return None
+    if isinstance(roles, str):
+        roles = [roles]
+    return {r.lower() for r in roles if isinstance(r, str)}
+
+
+def _rank_elements(tree, keywords: list, params: dict, limit: int) -> list:
+    """排序搜索元素；params.order 为 "document" 时结果改按文档顺序排列，模糊命中的结果带 fuzzy: True"""
+    # 首次访问 tree.index 会构建索引，与搜索一起放在执行器中完成
+    roles = _role_filter(params)
+    ranked = tree.index.search(
+        keywords,
+        mode=params.get("match", "all"),
+        case_sensitive=params.get("case_sensitive", False),
+        fuzzy=params.get("fuzzy"),
+        limit=0 if roles else limit,
+    )
+    if roles:
+        ranked = [item for item in ranked if item[0].role.lower() in roles]
+        if limit:
+            ranked = ranked[:limit]
+    if params.get("order") == "document":
+        ranked.sort(key=lambda item: item[0].index)
+    return [
+        {**node.to_dict(), "score": score, **({"fuzzy": True} if fuzzy else {})}
+        for node, score, fuzzy in ranked
+    ]
+
+
+def _locate_params(params: dict) -> dict:
+    """find_and_locate 的搜索选项：默认不模糊匹配，index 按文档顺序计数"""
+    return {**params, "fuzzy": params.get("fuzzy") or False, "order": params.get("order") or "document"}
+
+
+def _match_text(match: dict) -> str:
+    """匹配结果的一行描述，模糊命中时注明"""
+    return f"[{match['ref']}] {match['type']}: \"{match['text']}\"" + ("（模糊匹配）" if match.get("fuzzy") else "")
+
+
+def _rank_targets(tree, targets: list) -> list:
+    """批量定位：在同一份快照上依次搜索每个目标，返回每个目标的候选列表"""
+    return [_rank_elements(tree, target["keywords"], target["params"], 0) for target in targets]
+
+
+async def _search_elements(tree, keywords: list, params: dict, limit: int = 0) -> list:
+    """在快照索引中排序搜索元素，返回带 score 的匹配结果列表"""
+    return await run_cpu(_rank_elements, tree, keywords, params, limit, size=len(tree.raw))
+
+
+async def _poll(check, timeout: float, interval: float = DEFAULT_POLL_INTERVAL,
+                max_interval: float = DEFAULT_MAX_POLL_INTERVAL):
+    """按指数退避轮询 check(poll)，直到返回真值或超时
+
+    check 接收轮询序号（从 1 开始）。抛出的异常视为条件暂未满足（如页面正在跳转），
+    单次检查最多占用剩余时间（至少一个间隔）。
+
+    Returns:
+        (check 的返回值，超时为 None, 轮询次数, 最后一次异常)
+    """
+    deadline = time.monotonic() + timeout
+    delay = interval
+    polls = 0
+    error = None
+    while True:
+        polls += 1
+        remaining = deadline - time.monotonic()
+        try:
+            result = await asyncio.wait_for(check(polls), timeout=max(remaining, interval))
+            if result:
+                return result, polls, None
+            error = None
+        except Exception as e:
+            # 到期被打断的检查（无消息的 TimeoutError）不算出错
+            if str(e):
+                error = e
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None, polls, error
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_interval)
+
+
+async def _wait_url_change(context, url_before, timeout: float):
+    """等待当前标签页的 URL 与 url_before（操作前读取的 URL）不同，最多 timeout 秒
+
+    url_before 为 None（读取失败）时无从比较，直接等待 timeout 秒。
+    """
+    if url_before is None:
+        await asyncio.sleep(timeout)
+        return
+
+    async def changed(poll):
+        return await context.send_message("getUrl") != url_before
+
+    await _poll(changed, timeout)
+
+
+async def _wait_stable(fingerprint, window: float, timeout: float) -> bool:
+    """反复取页面指纹，指纹连续 window 秒不变即视为稳定
+
+    Args:
+        fingerprint: 返回当前页面指纹的协程函数，出错（如页面跳转中）视为页面仍在变化
+        window: 需要保持不变的秒数
+        timeout: 最长等待秒数
+
+    Returns:
+        是否在 timeout 内稳定
+    """
+
+    async def sample():
+        try:
+            return await fingerprint()
+        except Exception:
+            return object()
+
+    deadline = time.monotonic() + timeout
+    interval = max(window / 5, 0.05)
+    last = await sample()
+    stable_since = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if now - stable_since >= window:
+            return True
+        if now >= deadline:
+            return False
+        await asyncio.sleep(min(interval, deadline - now))
+        current = await sample()
+        if current != last:
+            last, stable_since = current, time.monotonic()
+
+
+def _finish_navigation_later(context, navigation: asyncio.Task):
+    """提前返回后，导航在后台完成时使该标签页的缓存失效（期间的读取可能是半加载页面）"""
+    cache = context.page_cache
+    tab_id = context.active_tab_id
+
+    def done(task: asyncio.Task):
+        if not task.cancelled():
+            task.exception()  # 取走异常，避免未处理异常警告
+        cache.invalidate()
+        context.dom_cache.invalidate(tab_id)
+
+    navigation.add_done_callback(done)
+
+
+async def _navigate_until(context, msg_type: str, payload: dict, params: dict):
+    """发送导航消息，按 params.wait_until 等待页面就绪，返回各里程碑耗时（毫秒）
+
+    扩展的导航消息在标签页加载完成（load）后才返回，且不推送页面事件，因此:
+        commit: 导航期间轮询 getUrl，URL 变化即视为已提交（刷新同一 URL 时等同 load）；
+            等待 load 及之后时不探测，commit 取导航消息返回的时间，不增加额外往返
+        domcontentloaded: 提交后轮询快照，内容脚本（document_idle 注入）能应答即视为 DOM 已就绪
+        load: 导航消息返回
+        network_idle: load 后页面 HTML 在稳定窗口内不再变化（扩展不暴露网络请求，以 HTML 变化近似）
+        dom_stable: load 后 ARIA 快照在稳定窗口内不再变化
+
+    commit/domcontentloaded 在导航完成前返回，导航在后台继续，完成时使页面缓存失效。
+    """
+    wait_until = params.get("wait_until", _config.get("navigate_wait_until", "load"))
+    if wait_until not in WAIT_UNTIL:
+        raise ValueError(f"wait_until 无效: {wait_until}，可选: {', '.join(WAIT_UNTIL)}")
+    target = WAIT_UNTIL.index(wait_until)
+
+    start = time.perf_counter()
+    milestones = {}
+
+    def mark(name: str):
+        milestones.setdefault(name, round((time.perf_counter() - start) * 1000, 2))
+
+    if target >= WAIT_UNTIL.index("load"):
+        # 等到 load 及之后：无需探测提交，导航消息返回时 commit 与 load 同时记录
+        await context.send_message(msg_type, payload)
+        mark("commit")
+        mark("load")
+    else:
+        await _navigate_early(context, msg_type, payload, target, mark)
+
+    if target > WAIT_UNTIL.index("load"):
+        window = float(params.get("stable_window", _config.get("stable_window", DEFAULT_STABLE_WINDOW)))
+        timeout = float(params.get("stable_timeout", _config.get("stable_timeout", DEFAULT_STABLE_TIMEOUT)))
+        if wait_until == "network_idle":
+
+            async def fingerprint():
+                return hash(await context.send_message("getPageHtml"))
+        else:
+
+            async def fingerprint():
+                tree = (await _page_state(context, {"fresh": True})).tree
+                return await run_cpu(tree.fingerprint, size=len(tree.raw))
+
+        if await _wait_stable(fingerprint, window, timeout):
+            mark(wait_until)
+    return milestones
+
+
+async def _navigate_early(context, msg_type: str, payload: dict, target: int, mark):
+    """commit / domcontentloaded：探测到目标里程碑即返回，导航在后台继续"""
+    # getUrl 先于导航消息发出，取到的是导航前的 URL
+    old_url_request = asyncio.create_task(context.send_message("getUrl"))
+    navigation = asyncio.create_task(context.send_message(msg_type, payload))
+
+    async def committed(poll):
+        if navigation.done():
+            return True
+        return await context.send_message("getUrl") != old_url
+
+    try:
+        old_url = await old_url_request
+    except Exception:
+        old_url = None
+    probe = asyncio.create_task(_poll(committed, 30.0))
+    try:
+        await asyncio.wait({probe, navigation}, return_when=asyncio.FIRST_COMPLETED)
+        mark("commit")
+        if target == WAIT_UNTIL.index("domcontentloaded") and not navigation.done():
+
+            async def dom_ready(poll):
+                if navigation.done():
+                    return True
+                state = await _page_state(context, {"fresh": True})
+                return state.url != old_url and bool(state.snapshot.strip())
+
+            ready = asyncio.create_task(_poll(dom_ready, 30.0))
+            await asyncio.wait({ready, navigation}, return_when=asyncio.FIRST_COMPLETED)
+            ready.cancel()
+            mark("domcontentloaded")
+        if navigation.done():
+            await navigation
+            mark("load")
+        else:
+            _finish_navigation_later(context, navigation)
+    except BaseException:
+        navigation.cancel()
+        raise
+    finally:
+        probe.cancel()
+
+
+def _milestone_text(milestones: dict, wait_until: str) -> str:
+    parts = [f"{name} {ms:g}ms" for name, ms in milestones.items()]
+    text = "就绪: " + ", ".join(parts)
+    if wait_until not in milestones:
+        text += f"（{wait_until} 未在等待时间内达到）"
+    return text
+
+
+async def _navigation_tool(context, msg_type: str, payload: dict, params: dict) -> dict:
+    try:
+        milestones = await _navigate_until(context, msg_type, payload, params)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    wait_until = params.get("wait_until", _config.get("navigate_wait_until", "load"))
+    snapshot = await capture_aria_snapshot(
+        context,
+        _milestone_text(milestones, wait_until),
+        save_path=params.get("snapshot_file", ""),
+        diff=_snapshot_diff(params),
+    )
+    snapshot["milestones"] = milestones
+    return {"success": True, "data": snapshot}
+
+
 # === 导航类工具 ===
 
+
 async def navigate(context, params: dict) -> dict:
-    """导航到指定 URL"""
+    """导航到指定 URL
+
+    参数:
+        url: 目标 URL
+        wait_until: 就绪策略 commit / domcontentloaded / load / network_idle / dom_stable
+            （默认从 config.json 的 navigate_wait_until 读取，兜底 load），说明见 _navigate_until
+        stable_window: network_idle / dom_stable 要求页面保持不变的秒数（默认 0.5）
+        stable_timeout: 等待页面稳定的最长秒数（默认 10），超时不报错，结果中注明未达到
+
+    结果的 milestones 为到达各里程碑的耗时（毫秒）。
+    """
     url = params.get("url", "")
     if not url:
         return {"success": False, "error": "缺少 url 参数"}
-    await context.send_message("browser_navigate", {"url": url})
-    snapshot = await capture_aria_snapshot(context, save_path=params.get("snapshot_file", ""))
-    return {"success": True, "data": snapshot}
+    return await _navigation_tool(context, "browser_navigate", {"url": url}, params)
 
 
 async def go_back(context, params: dict) -> dict:
-    """浏览器后退"""
-    await context.send_message("browser_go_back", {})
-    snapshot = await capture_aria_snapshot(context, save_path=params.get("snapshot_file", ""))
-    return {"success": True, "data": snapshot}
+    """浏览器后退（wait_until 等参数同 navigate）"""
+    return await _navigation_tool(context, "browser_go_back", {}, params)
 
 
 async def go_forward(context, params: dict) -> dict:
-    """浏览器前进"""
-    await context.send_message("browser_go_forward", {})
-    snapshot = await capture_aria_snapshot(context, save_path=params.get("snapshot_file", ""))
-    return {"success": True, "data": snapshot}
+    """浏览器前进（wait_until 等参数同 navigate）"""
+    return await _navigation_tool(context, "browser_go_forward", {}, params)
 
 
 # === 页面交互工具 ===
 
+def _settle_mode(params: dict) -> str:
+    mode = params.get("settle", _config.get("settle", "none"))
+    if mode is None or mode is False:
+        return "none"
+    if mode is True:
+        return "html"
+    if mode not in SETTLE_MODES:
+        raise ValueError(f"settle 无效: {mode}，可选: {', '.join(SETTLE_MODES)}")
+    return mode
+
+
+async def _settle(context, mode: str, params: dict, url_before) -> dict:
+    """交互后等待页面稳定，返回 {"settle_ms": 耗时, "settled": 是否在最长等待内达到}
+
+    mode:
+        html: 页面 HTML 与 URL 在静默窗口内不再变化（不取快照，已有的 ref 保持有效）
+        dom: ARIA 快照与 URL 在静默窗口内不再变化（刷新快照，之前的 ref 失效，最后一份快照写入缓存）
+        url: URL 相对交互前发生变化（用于已知会跳转的点击）
+    """
+    window = float(params.get("settle_window", _config.get("settle_window", DEFAULT_SETTLE_WINDOW)))
+    timeout = float(params.get("settle_timeout", _config.get("settle_timeout", DEFAULT_SETTLE_TIMEOUT)))
+    start = time.perf_counter()
+    if mode == "url":
+
+        async def changed(poll):
+            return await context.send_message("getUrl") != url_before
+
+        settled = bool((await _poll(changed, timeout))[0])
+    else:
+        if mode == "dom":
+
+            async def fingerprint():
+                state = await _page_state(context, {"fresh": True})
+                return state.url, await run_cpu(state.tree.fingerprint, size=len(state.tree.raw))
+        else:
+
+            async def fingerprint():
+                url, page_html = await context.send_batch(["getUrl", "getPageHtml"])
+                return url, hash(page_html)
+
+        settled = await _wait_stable(fingerprint, window, timeout)
+    return {"settle_ms": round((time.perf_counter() - start) * 1000, 2), "settled": settled}
+
+
+async def _interact(context, params: dict, action, status: str) -> dict:
+    """执行交互 action()，按 params.settle 等待页面稳定后返回页面信息
+
+    参数（所有交互共用）:
+        settle: 稳定检测方式 html / dom / url / none（默认从 config.json 读取，兜底 none；
+            html/dom 要多次取整页内容且至少等待一个静默窗口，按需开启）
+        settle_window: 页面保持不变多少秒视为稳定（默认 0.3）
+        settle_timeout: 最长等待秒数（默认 5），超时不报错，结果中 settled 为 false
+    """
+    try:
+        mode = _settle_mode(params)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    url_before = await context.send_message("getUrl") if mode == "url" else None
+    await action()
+    settle = None
+    if mode != "none":
+        settle = await _settle(context, mode, params, url_before)
+        state = "已稳定" if settle["settled"] else "未稳定"
+        if mode == "url":
+            state = "URL 已变化" if settle["settled"] else "URL 未变化"
+        status += f"（{state}，等待 {settle['settle_ms']:g}ms）"
+    snapshot = await capture_aria_snapshot(context, status, save_path=params.get("snapshot_file", ""), diff=_snapshot_diff(params))
+    if settle is not None:
+        snapshot.update(settle)
+    return {"success": True, "data": snapshot}
+
+
 async def click(context, params: dict) -> dict:
-    """点击页面元素，支持 ref 或坐标"""
-    import asyncio
+    """点击页面元素，支持 ref 或坐标（settle 等参数见 _interact）"""
     ref = params.get("ref", "")
     x = params.get("x")
     y = params.get("y")
 
     if x is not None and y is not None:
         # 坐标点击
+        msg_type, payload, status = "browser_click_at", {"x": x, "y": y}, f'已点击坐标 ({x}, {y})'
+    elif ref:
+        msg_type, payload, status = "browser_click", {"ref": ref}, f'已点击 ref={ref}'
+    else:
+        return {"success": False, "error": "缺少 ref 参数或坐标参数 (x, y)"}
+
+    async def action():
+        # getUrl 先于点击发出（任务按创建顺序开始执行），取到的是点击前的 URL；与点击并发，不额外增加往返
+        url_request = asyncio.create_task(context.send_message("getUrl"))
+        click_request = asyncio.create_task(context.send_message(msg_type, payload, timeout_ms=5000))
         try:
-            await context.send_message("browser_click_at", {"x": x, "y": y}, timeout_ms=5000)
+            await click_request
+            timed_out = False
         except TimeoutError:
-            await asyncio.sleep(1)
-        snapshot = await capture_aria_snapshot(context, f'已点击坐标 ({x}, {y})', save_path=params.get("snapshot_file", ""))
-        return {"success": True, "data": snapshot}
+            timed_out = True
+        try:
+            url_before = await url_request
+        except Exception:
+            url_before = None
+        if timed_out:
+            # 点击触发跳转时扩展可能来不及应答，等待 URL 变化
+            await _wait_url_change(context, url_before, CLICK_NAVIGATION_WAIT)
 
-    if not ref:
-        return {"success": False, "error": "缺少 ref 参数或坐标参数 (x, y)"}
-    try:
-        await context.send_message("browser_click", {"ref": ref}, timeout_ms=5000)
-    except TimeoutError:
-        await asyncio.sleep(1)
-    snapshot = await capture_aria_snapshot(context, f'已点击 ref={ref}', save_path=params.get("snapshot_file", ""))
-    return {"success": True, "data": snapshot}
+    return await _interact(context, params, action, status)
 
 
 async def hover(context, params: dict) -> dict:
@@ -95,12 +503,12 @@ async def hover(context, params: dict) -> dict:
     if not ref:
         return {"success": False, "error": "缺少 ref 参数（使用 snapshot 中的 ref 值）"}
     await context.send_message("browser_hover", {"ref": ref})
-    snapshot = await capture_aria_snapshot(context, f'已悬停 ref={ref}', save_path=params.get("snapshot_file", ""))
+    snapshot = await capture_aria_snapshot(context, f'已悬停 ref={ref}', save_path=params.get("snapshot_file", ""), diff=_snapshot_diff(params))
     return {"success": True, "data": snapshot}
 
 
 async def type_text(context, params: dict) -> dict:
-    """在元素中输入文本"""
+    """在元素中输入文本（settle 等参数见 _interact）"""
     ref = params.get("ref", "")
     text = params.get("text", "")
     submit = params.get("submit", False)
@@ -108,22 +516,26 @@ async def type_text(context, params: dict) -> dict:
         return {"success": False, "error": "缺少 ref 参数（使用 snapshot 中的 ref 值）"}
     if not text:
         return {"success": False, "error": "缺少 text 参数"}
-    await context.send_message("browser_type", {"ref": ref, "text": text, "submit": submit})
-    snapshot = await capture_aria_snapshot(context, f'已在 ref={ref} 中输入 "{text}"', save_path=params.get("snapshot_file", ""))
-    return {"success": True, "data": snapshot}
+
+    async def action():
+        await context.send_message("browser_type", {"ref": ref, "text": text, "submit": submit})
+
+    return await _interact(context, params, action, f'已在 ref={ref} 中输入 "{text}"')
 
 
 async def select_option(context, params: dict) -> dict:
-    """选择下拉菜单选项"""
+    """选择下拉菜单选项（settle 等参数见 _interact）"""
     ref = params.get("ref", "")
     values = params.get("values", [])
     if not ref:
         return {"success": False, "error": "缺少 ref 参数（使用 snapshot 中的 ref 值）"}
     if not values:
         return {"success": False, "error": "缺少 values 参数"}
-    await context.send_message("browser_select_option", {"ref": ref, "values": values})
-    snapshot = await capture_aria_snapshot(context, f'已在 ref={ref} 中选择选项', save_path=params.get("snapshot_file", ""))
-    return {"success": True, "data": snapshot}
+
+    async def action():
+        await context.send_message("browser_select_option", {"ref": ref, "values": values})
+
+    return await _interact(context, params, action, f'已在 ref={ref} 中选择选项')
 
 
 async def drag(context, params: dict) -> dict:
@@ -133,7 +545,7 @@ async def drag(context, params: dict) -> dict:
     if not start_ref or not end_ref:
         return {"success": False, "error": "缺少 startRef 或 endRef 参数"}
     await context.send_message("browser_drag", {"startRef": start_ref, "endRef": end_ref})
-    snapshot = await capture_aria_snapshot(context, f'已将 ref={start_ref} 拖拽到 ref={end_ref}', save_path=params.get("snapshot_file", ""))
+    snapshot = await capture_aria_snapshot(context, f'已将 ref={start_ref} 拖拽到 ref={end_ref}', save_path=params.get("snapshot_file", ""), diff=_snapshot_diff(params))
     return {"success": True, "data": snapshot}
 
 
@@ -167,18 +579,183 @@ async def wait(context, params: dict) -> dict:
     return {"success": True, "data": {"type": "text", "text": f"已等待 {time_sec} 秒"}}
 
 
+def _text_present(tree, text: str, case_sensitive: bool) -> bool:
+    if not case_sensitive:
+        text = text.lower()
+    for line in tree.texts():
+        if text in (line if case_sensitive else line.lower()):
+            return True
+    return False
+
+
+def _xpath_matched(tree, xpath_expr: str) -> bool:
+    result = _compile_xpath(xpath_expr, threading.get_ident())(tree)
+    if isinstance(result, list):
+        return bool(result)
+    # count()/boolean() 等表达式返回标量
+    return result not in ("", None, False, 0, 0.0)
+
+
+async def wait_for(context, params: dict) -> dict:
+    """等待页面满足条件，满足后立即返回
+
+    参数（条件至少一个，多个条件需同时满足）:
+        text: 页面可见文字中包含该文本
+        keyword / keywords: 存在匹配的元素（同 find_element，match/case_sensitive 含义相同，默认不做模糊匹配）
+        xpath: XPath 匹配到元素（或标量表达式结果为真）
+        gone: 为 true 时 text/keyword/xpath 改为等待其消失（如加载提示）
+        url: URL 匹配该正则（search 语义，普通子串即可）
+        url_changed: 为 true 时等待 URL 与开始等待时不同
+        title: 标题匹配该正则
+        case_sensitive: text 是否区分大小写（默认 False）
+        timeout: 最长等待秒数（默认从 config.json 读取，兜底 10）
+        interval: 首次轮询间隔秒数，之后每次翻倍，不超过 max_interval（默认 0.1 / 1）
+
+    扩展不推送页面事件，因此在服务器内轮询。首次检查使用页面缓存（刚执行过的查询无需
+    再取），之后每次重新获取；只检查 URL/标题时只发 getUrl/getTitle，不取快照。
+    等待快照条件时会刷新快照，此前的 ref 随之失效；keyword 条件满足时返回匹配元素的 ref。
+    """
+    keywords = _search_keywords(params)
+    text = params.get("text") or ""
+    xpath_expr = params.get("xpath") or ""
+    gone = bool(params.get("gone", False))
+    case_sensitive = params.get("case_sensitive", False)
+    url_changed = bool(params.get("url_changed", False))
+    try:
+        url_re = re.compile(params["url"]) if params.get("url") else None
+        title_re = re.compile(params["title"]) if params.get("title") else None
+    except re.error as e:
+        return {"success": False, "error": f"正则表达式错误: {e}"}
+    if xpath_expr:
+        try:
+            _compile_xpath(xpath_expr, threading.get_ident())
+        except Exception as e:
+            return {"success": False, "error": f"XPath 表达式错误: {xpath_expr}: {e}"}
+
+    conditions = []
+    if text:
+        conditions.append(f"文字 \"{text}\"" + (" 消失" if gone else " 出现"))
+    if keywords:
+        conditions.append(f"元素 \"{' / '.join(keywords)}\"" + (" 消失" if gone else " 出现"))
+    if xpath_expr:
+        conditions.append(f"XPath {xpath_expr}" + (" 不再匹配" if gone else " 匹配"))
+    if url_re:
+        conditions.append(f"URL 匹配 {url_re.pattern}")
+    if url_changed:
+        conditions.append("URL 变化")
+    if title_re:
+        conditions.append(f"标题匹配 {title_re.pattern}")
+    if not conditions:
+        return {"success": False, "error": "缺少等待条件（text/keyword/xpath/url/url_changed/title）"}
+
+    timeout = float(params.get("timeout", _config.get("wait_for_timeout", DEFAULT_WAIT_TIMEOUT)))
+    interval = float(params.get("interval", _config.get("wait_for_interval", DEFAULT_POLL_INTERVAL)))
+    max_interval = float(params.get("max_interval", _config.get("wait_for_max_interval", DEFAULT_MAX_POLL_INTERVAL)))
+    search_params = {**params, "fuzzy": params.get("fuzzy", False)}
+
+    # 开始等待时的 URL；快照基准只在保存快照时更新，导航或点击后可能已过期，不能用作比较。
+    # 页面正在跳转取不到时，以首次检查取到的 URL 为准
+    start_url = [None]
+    if url_changed:
+        try:
+            start_url[0] = await context.send_message("getUrl")
+        except Exception:
+            pass
+    observed = {}
+
+    async def check(poll):
+        fresh = poll > 1
+        if text or keywords:
+            state = await _page_state(context, {"fresh": fresh})
+            url, title = state.url, state.title
+            if text:
+                found = await run_cpu(_text_present, state.tree, text, case_sensitive, size=len(state.tree.raw))
+                if found == gone:
+                    return None
+            if keywords:
+                matches = await _search_elements(state.tree, keywords, search_params, limit=5)
+                if bool(matches) == gone:
+                    return None
+                observed["matches"] = matches
+        elif url_re or url_changed or title_re:
+            if title_re and (url_re or url_changed):
+                url, title = await context.send_batch(["getUrl", "getTitle"])
+            elif title_re:
+                url, title = None, await context.send_message("getTitle")
+            else:
+                url, title = await context.send_message("getUrl"), None
+        else:
+            url = title = None
+        if url is not None:
+            observed["url"] = url
+        if title is not None:
+            observed["title"] = title
+
+        if start_url[0] is None and url is not None:
+            start_url[0] = url
+        if url_changed and url == start_url[0]:
+            return None
+        if url_re and not url_re.search(url or ""):
+            return None
+        if title_re and not title_re.search(title or ""):
+            return None
+        if xpath_expr:
+            tree = await _page_dom(context, {"fresh": fresh})
+            if await run_cpu(_xpath_matched, tree, xpath_expr) == gone:
+                return None
+        return True
+
+    start = time.perf_counter()
+    met, polls, error = await _poll(check, timeout, interval, max_interval)
+    elapsed = time.perf_counter() - start
+    description = "，".join(conditions)
+
+    if not met:
+        message = f"等待超时（{timeout:g}s，轮询 {polls} 次）: {description}"
+        if error is not None:
+            message += f"；最后一次检查出错: {error}"
+        elif observed.get("url") is not None:
+            message += f"；当前 URL: {observed['url']}"
+        return {"success": False, "error": message}
+
+    lines = [f"条件已满足: {description}（{elapsed:.2f}s，轮询 {polls} 次）"]
+    if observed.get("url") is not None:
+        lines.append(f"- Page URL: {observed['url']}")
+    if observed.get("title") is not None:
+        lines.append(f"- Page Title: {observed['title']}")
+    data = {
+        "type": "text",
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "polls": polls,
+    }
+    if observed.get("url") is not None:
+        data["url"] = observed["url"]
+    if observed.get("title") is not None:
+        data["title"] = observed["title"]
+    matches = observed.get("matches")
+    if matches and not gone:
+        lines.append("匹配元素:")
+        for m in matches:
+            lines.append(f"  [{m['ref']}] {m['type']}: \"{m['text']}\"")
+        data["matches"] = matches
+    data["text"] = "\n".join(lines)
+    return {"success": True, "data": data}
+
+
 # === 信息获取工具 ===
 
+def _write_base64(path: Path, data: str):
+    import base64
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(base64.b64decode(data))
+
+
 async def screenshot(context, params: dict) -> dict:
     """截取当前页面截图"""
-    import base64
     image_data = await context.send_message("browser_screenshot", {})
     save_path = params.get("savePath", "")
     if save_path:
-        from pathlib import Path
-        path = Path(save_path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_bytes(base64.b64decode(image_data))
+        await run_cpu(_write_base64, Path(save_path), image_data, size=len(image_data))
         return {
             "success": True,
             "data": {"type": "text", "text": f"截图已保存到 {save_path}"},
@@ -196,6 +773,7 @@ async def snapshot(context, params: dict) -> dict:
         snapshot_file: 保存快照到文件路径（可选）
         inline: 为 true 时直接在响应中返回快照内容（可选）
         max_length: 快照最大字符数，0 不截断（默认从 config.json 读取，兜底 0）
+        snapshot_diff: 为 true 时只输出相对上一份快照的增量（默认从 config.json 读取，兜底 False）
     """
     max_length = params.get("max_length", _config.get("snapshot_max_length", 0))
     result = await capture_aria_snapshot(
@@ -203,6 +781,7 @@ async def snapshot(context, params: dict) -> dict:
         save_path=params.get("snapshot_file", ""),
         max_length=max_length,
         inline=params.get("inline", False),
+        diff=_snapshot_diff(params),
     )
     return {"success": True, "data": result}
 
@@ -219,45 +798,15 @@ async def get_text(context, params: dict) -> dict:
 
     参数:
         max_length: 最大返回字符数（默认 5000）
+        fresh: 为 true 时跳过页面缓存，重新获取快照（默认 False）
 
     从 snapshot 中提取所有文本内容，过滤掉元素标记
     """
-    import re
     max_length = params.get("max_length", 5000)
 
-    # 获取 snapshot
-    snapshot_result = await context.send_message("browser_snapshot", {})
-    snapshot_text = snapshot_result if isinstance(snapshot_result, str) else str(snapshot_result)
+    tree = (await _page_state(context, params)).tree
 
-    # 提取纯文字内容
-    lines = []
-    for line in snapshot_text.split('\n'):
-        # 跳过纯结构行（只有 - 类型 [ref=xxx] 的行）
-        if re.match(r'^\s*-\s+\w+\s*\[ref=', line):
-            continue
-        # 提取 text: 后的内容
-        text_match = re.search(r'text:\s*(.+)$', line)
-        if text_match:
-            text = text_match.group(1).strip().strip('"').strip("'")
-            if text and text not in ['|', '-', '·']:
-                lines.append(text)
-            continue
-        # 提取引号内的文本（如 link "文本" [ref=xxx]）
-        quote_match = re.search(r'"([^"]+)"', line)
-        if quote_match and '[ref=' in line:
-            text = quote_match.group(1).strip()
-            if text and len(text) > 1:
-                lines.append(text)
-
-    # 去重并合并
-    seen = set()
-    unique_lines = []
-    for line in lines:
-        if line not in seen:
-            seen.add(line)
-            unique_lines.append(line)
-
-    result_text = '\n'.join(unique_lines)
+    result_text = '\n'.join(await run_cpu(tree.texts, size=len(tree.raw)))
     if len(result_text) > max_length:
         result_text = result_text[:max_length] + '\n...(已截断)'
 
@@ -274,68 +823,40 @@ async def find_element(context, params: dict) -> dict:
     """通过关键字搜索页面元素
 
     参数:
-        keyword: 搜索关键字（必填）
+        keyword: 搜索关键字（与 keywords 二选一）
+        keywords: 多个关键字列表
+        match: 多关键字时 "all"（全部命中，默认）或 "any"（任一命中）
         case_sensitive: 是否区分大小写（默认 False）
+        fuzzy: 是否启用模糊匹配（默认仅在无直接命中时启用）
+        role: 只匹配指定角色的元素（如 "button"，或角色列表）
         max_results: 最大返回数量（默认 20）
+        fresh: 为 true 时跳过页面缓存，重新获取快照（默认 False）
 
-    返回匹配的元素列表，包含 ref、类型和文本内容
+    按相关度排序（完全匹配 > 前缀 > 整词 > 子串 > 模糊，可交互元素加权），
+    返回匹配的元素列表，包含 ref、类型、文本内容和分数
     """
-    import re
-    keyword = params.get("keyword", "")
-    if not keyword:
+    keywords = _search_keywords(params)
+    if not keywords:
         return {"success": False, "error": "缺少 keyword 参数"}
 
-    case_sensitive = params.get("case_sensitive", False)
     max_results = params.get("max_results", 20)
 
-    # 获取 snapshot
-    snapshot_result = await context.send_message("browser_snapshot", {})
-    snapshot_text = snapshot_result if isinstance(snapshot_result, str) else str(snapshot_result)
-
-    # 解析 snapshot 找到匹配的元素
-    # snapshot 格式示例:
-    # - link "搜索" [ref=s1e123]:
-    # - button "提交" [ref=s1e456]
-    # - textbox "请输入关键词" [ref=s1e789]
-
-    flags = 0 if case_sensitive else re.IGNORECASE
-    matches = []
-
-    # 匹配带 ref 的元素行
-    # 格式: - 类型 "文本" [ref=xxx] 或 - 类型 [ref=xxx]
-    pattern = r'-\s+(\w+)(?:\s+"([^"]*)")?\s*\[ref=([^\]]+)\]'
-
-    for match in re.finditer(pattern, snapshot_text):
-        elem_type = match.group(1)
-        elem_text = match.group(2) or ""
-        elem_ref = match.group(3)
-
-        # 检查关键字是否匹配
-        search_text = elem_text if case_sensitive else elem_text.lower()
-        search_keyword = keyword if case_sensitive else keyword.lower()
-
-        if search_keyword in search_text:
-            matches.append({
-                "ref": elem_ref,
-                "type": elem_type,
-                "text": elem_text
-            })
-            if len(matches) >= max_results:
-                break
+    tree = (await _page_state(context, params)).tree
+    matches = await _search_elements(tree, keywords, params, limit=max_results)
 
     if not matches:
         return {
             "success": True,
             "data": {
                 "type": "text",
-                "text": f"未找到包含 \"{keyword}\" 的元素"
+                "text": f"未找到包含 \"{' / '.join(keywords)}\" 的元素"
             }
         }
 
     # 格式化输出
     lines = [f"找到 {len(matches)} 个匹配元素:"]
     for m in matches:
-        lines.append(f"  [{m['ref']}] {m['type']}: \"{m['text']}\"")
+        lines.append(f"  {_match_text(m)}")
 
     return {
         "success": True,
@@ -347,87 +868,175 @@ async def find_element(context, params: dict) -> dict:
     }
 
 
+def _locate_targets(params: dict) -> list:
+    """规范化 targets 参数: 每项为关键字字符串或 {keyword/keywords, index, role, match, ...}"""
+    if not isinstance(params["targets"], list):
+        raise ValueError("targets 必须是列表")
+    targets = []
+    for i, item in enumerate(params["targets"]):
+        if isinstance(item, str):
+            item = {"keyword": item}
+        if not isinstance(item, dict):
+            raise ValueError(f"targets 第 {i + 1} 项格式错误，应为关键字或对象")
+        keywords = _search_keywords(item)
+        if not keywords:
+            raise ValueError(f"targets 第 {i + 1} 项缺少 keyword")
+        # 未单独指定的搜索选项沿用外层参数
+        target_params = _locate_params({
+            key: item.get(key, params.get(key))
+            for key in ("match", "case_sensitive", "fuzzy", "role", "order")
+        })
+        targets.append({
+            "key": item.get("name") or " / ".join(keywords),
+            "keywords": keywords,
+            "index": item.get("index", 0),
+            "params": {k: v for k, v in target_params.items() if v is not None},
+        })
+    keys = [t["key"] for t in targets]
+    if len(set(keys)) != len(keys):
+        raise ValueError("targets 中有重复的关键字，请用 name 区分")
+    return targets
+
+
+async def _locate_many(context, params: dict) -> dict:
+    """find_and_locate 的批量形式：一次快照匹配所有目标，并发获取坐标"""
+    try:
+        targets = _locate_targets(params)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    if not targets:
+        return {"success": False, "error": "targets 为空"}
+
+    fresh = params.get("fresh", False)
+    while True:
+        state = await _page_state(context, {"fresh": fresh})
+        candidates = await run_cpu(_rank_targets, state.tree, targets, size=len(state.tree.raw))
+
+        elements, errors = {}, {}
+        for target, matches in zip(targets, candidates):
+            if not matches:
+                errors[target["key"]] = "未找到匹配元素"
+            elif target["index"] >= len(matches):
+                errors[target["key"]] = f"索引 {target['index']} 超出范围，只找到 {len(matches)} 个匹配元素"
+            else:
+                elements[target["key"]] = matches[target["index"]]
+
+        # 同一元素只取一次坐标
+        refs = list(dict.fromkeys(element["ref"] for element in elements.values()))
+        results = await asyncio.gather(
+            *(context.send_message("browser_get_coordinates", {"ref": ref}, timeout_ms=10000) for ref in refs),
+            return_exceptions=True,
+        )
+        coords = dict(zip(refs, results))
+        # 缓存的快照已过期（如页面自行刷新），重新获取快照后整体重试一次
+        if not fresh and any(isinstance(r, Exception) and _is_stale_ref_error(r) for r in results):
+            fresh = True
+            continue
+        break
+
+    lines = []
+    for target in targets:
+        key = target["key"]
+        element = elements.get(key)
+        if element is not None:
+            result = coords[element["ref"]]
+            if isinstance(result, Exception):
+                errors[key] = f"获取坐标失败: {result}"
+                del elements[key]
+            else:
+                elements[key] = {**element, "x": result.get("x"), "y": result.get("y")}
+                lines.append(f"  {key} → {_match_text(element)} x={result.get('x')}, y={result.get('y')}")
+                continue
+        lines.append(f"  {key} ✗ {errors[key]}")
+
+    header = f"定位 {len(elements)}/{len(targets)} 个元素" + (f"，{len(errors)} 个失败" if errors else "") + ":"
+    data = {
+        "type": "text",
+        "text": "\n".join([header] + lines),
+        "elements": elements,
+        "errors": errors,
+    }
+    if not elements:
+        return {"success": False, "error": f"所有目标均定位失败（{len(errors)} 个）", "data": data}
+    return {"success": True, "data": data}
+
+
 async def find_and_locate(context, params: dict) -> dict:
     """搜索元素并立即获取坐标（解决 ref 过期问题）
 
     参数:
-        keyword: 搜索关键字（必填）
+        keyword: 搜索关键字（与 keywords 二选一）
+        keywords: 多个关键字列表（match 同 find_element）
         index: 匹配结果索引，默认 0（第一个匹配）
+        order: index 的计数顺序，"document"（文档顺序，默认）或 "rank"（相关度降序）
+        role: 只匹配指定角色的元素（如 "textbox"，或角色列表）
         case_sensitive: 是否区分大小写（默认 False）
+        fuzzy: 是否启用模糊匹配（默认 False；命中的元素带 fuzzy: true）
+        fresh: 为 true 时跳过页面缓存，重新获取快照（默认 False）
+        targets: 批量定位，列表项为关键字字符串或 {keyword/keywords, index, role, match, order, name}，
+            未指定的 match/case_sensitive/fuzzy/role/order 沿用外层参数。共用一次快照匹配，坐标并发获取，
+            返回 elements（name 或关键字 → 元素及坐标）和 errors（失败原因），部分失败仍算成功
 
     返回匹配元素的 ref、类型、文本和坐标
     """
-    import re
-    keyword = params.get("keyword", "")
-    if not keyword:
+    if params.get("targets") is not None:
+        return await _locate_many(context, params)
+
+    keywords = _search_keywords(params)
+    if not keywords:
         return {"success": False, "error": "缺少 keyword 参数"}
 
     index = params.get("index", 0)
-    case_sensitive = params.get("case_sensitive", False)
-
-    # 获取 snapshot
-    snapshot_result = await context.send_message("browser_snapshot", {})
-    snapshot_text = snapshot_result if isinstance(snapshot_result, str) else str(snapshot_result)
-
-    # 解析 snapshot 找到匹配的元素
-    pattern = r'-\s+(\w+)(?:\s+"([^"]*)")?\s*\[ref=([^\]]+)\]'
-    matches = []
 
-    for match in re.finditer(pattern, snapshot_text):
-        elem_type = match.group(1)
-        elem_text = match.group(2) or ""
-        elem_ref = match.group(3)
-
-        search_text = elem_text if case_sensitive else elem_text.lower()
-        search_keyword = keyword if case_sensitive else keyword.lower()
-
-        if search_keyword in search_text:
-            matches.append({
-                "ref": elem_ref,
-                "type": elem_type,
-                "text": elem_text
-            })
-
-    if not matches:
-        return {
-            "success": True,
-            "data": {
-                "type": "text",
-                "text": f"未找到包含 \"{keyword}\" 的元素"
+    fresh = params.get("fresh", False)
+    while True:
+        state = await _page_state(context, {**params, "fresh": fresh})
+        matches = await _search_elements(state.tree, keywords, _locate_params(params))
+
+        if not matches:
+            return {
+                "success": True,
+                "data": {
+                    "type": "text",
+                    "text": f"未找到包含 \"{' / '.join(keywords)}\" 的元素"
+                }
             }
-        }
 
-    if index >= len(matches):
-        return {
-            "success": False,
-            "error": f"索引 {index} 超出范围，只找到 {len(matches)} 个匹配元素"
-        }
+        if index >= len(matches):
+            return {
+                "success": False,
+                "error": f"索引 {index} 超出范围，只找到 {len(matches)} 个匹配元素"
+            }
 
-    target = matches[index]
+        target = matches[index]
 
-    # 立即获取坐标（在同一个 snapshot 周期内，ref 有效）
-    try:
-        coords = await context.send_message("browser_get_coordinates", {"ref": target["ref"]}, timeout_ms=10000)
-        target["x"] = coords.get("x")
-        target["y"] = coords.get("y")
-
-        return {
-            "success": True,
-            "data": {
-                "type": "text",
-                "text": f"找到元素: [{target['ref']}] {target['type']}: \"{target['text']}\"\n坐标: x={target['x']}, y={target['y']}",
-                "element": target
+        # 立即获取坐标（在同一个 snapshot 周期内，ref 有效）
+        try:
+            coords = await context.send_message("browser_get_coordinates", {"ref": target["ref"]}, timeout_ms=10000)
+            target["x"] = coords.get("x")
+            target["y"] = coords.get("y")
+
+            return {
+                "success": True,
+                "data": {
+                    "type": "text",
+                    "text": f"找到元素: {_match_text(target)}\n坐标: x={target['x']}, y={target['y']}",
+                    "element": target
+                }
             }
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": f"获取坐标失败: {str(e)}",
-            "data": {
-                "element": target,
-                "all_matches": matches
+        except Exception as e:
+            # 缓存的快照已过期（如页面自行刷新），重新获取快照后重试一次
+            if not fresh and _is_stale_ref_error(e):
+                fresh = True
+                continue
+            return {
+                "success": False,
+                "error": f"获取坐标失败: {str(e)}",
+                "data": {
+                    "element": target,
+                    "all_matches": matches
+                }
             }
-        }
 
 
 async def get_html(context, params: dict) -> dict:
@@ -458,6 +1067,7 @@ async def list_tabs(context, params: dict) -> dict:
     if active_tab:
         try:
             await context.send_message("browser_switch_tab", {"tabId": active_tab["id"]})
+            context.active_tab_id = active_tab["id"]
         except Exception:
             pass  # 刷新失败不影响 list_tabs 结果
     lines = []
@@ -471,6 +1081,7 @@ async def new_tab(context, params: dict) -> dict:
     """打开新标签页"""
     url = params.get("url", "about:blank")
     result = await context.send_message("browser_new_tab", {"url": url})
+    context.active_tab_id = result.get("id")
     return {"success": True, "data": {"type": "text", "text": f"已打开新标签页: id={result.get('id')}, url={result.get('url', url)}"}}
 
 
@@ -480,11 +1091,13 @@ async def switch_tab(context, params: dict) -> dict:
     if not tab_id:
         return {"success": False, "error": "缺少 tabId 参数（先用 list_tabs 获取）"}
     result = await context.send_message("browser_switch_tab", {"tabId": tab_id})
+    context.active_tab_id = tab_id
     # 切换后获取快照，确认 debugger 已正确 attach 到新标签页
     snapshot = await capture_aria_snapshot(
         context,
         status=f"已切换到标签页: id={tab_id}, title={result.get('title', '')}, url={result.get('url', '')}",
         save_path=params.get("snapshot_file", ""),
+        diff=_snapshot_diff(params),
     )
     return {"success": True, "data": snapshot}
 
@@ -496,17 +1109,105 @@ async def close_tab(context, params: dict) -> dict:
         return {"success": False, "error": "缺少 tabId 参数（先用 list_tabs 获取）"}
     result = await context.send_message("browser_close_tab", {"tabId": tab_id})
     switched_to = result.get("switchedTo")
+    context.forget_tab(tab_id)
+    if switched_to or context.active_tab_id == tab_id:
+        context.active_tab_id = switched_to
     msg = f"已关闭标签页 {result.get('closed', tab_id)}"
     if switched_to:
         msg += f"，已自动切换到标签页 {switched_to}"
     return {"success": True, "data": {"type": "text", "text": msg}}
 
 
+@lru_cache(maxsize=256)
+def _compile_xpath(expr: str, thread_id: int):
+    """编译 XPath 表达式（按表达式字符串缓存）
+
+    XPath 对象不在线程间共享，缓存键包含线程 id。
+    """
+    from lxml import etree
+    return etree.XPath(expr)
+
+
+def _run_xpaths(tree, xpaths: list, output_type: str, attr_name: str, max_results: int) -> list:
+    """在解析后的树上依次执行 XPath，返回每条表达式的结果（在执行器线程中运行）"""
+    thread_id = threading.get_ident()
+    queries = []
+    for xpath_expr in xpaths:
+        try:
+            results = _compile_xpath(xpath_expr, thread_id)(tree)
+        except Exception as e:
+            raise ValueError(f"XPath 表达式错误: {xpath_expr}: {e}")
+        if not isinstance(results, list):
+            # string()/count() 等表达式返回标量
+            results = [results] if results not in ("", None) else []
+        items = _format_xpath_nodes(results, output_type, attr_name, max_results)
+        queries.append({"xpath": xpath_expr, "count": len(results), "items": items})
+    return queries
+
+
+async def _page_dom(context, params: dict):
+    """获取当前页面解析后的 lxml 树，优先使用 DOM 缓存"""
+    from lxml import html as lxml_html
+
+    key = context.active_tab_id
+    epoch = context.page_cache.epoch
+    ttl = _config.get("snapshot_cache_ttl", DEFAULT_TTL)
+    if not params.get("fresh", False):
+        tree = context.dom_cache.get(key, epoch, ttl)
+        if tree is not None:
+            return tree
+
+    try:
+        page_html = await context.send_message("getPageHtml", {})
+    except Exception as e:
+        raise RuntimeError(f"获取页面 HTML 失败: {e}")
+    try:
+        tree = await run_cpu(lxml_html.fromstring, page_html, size=len(page_html))
+    except Exception as e:
+        raise RuntimeError(f"解析 HTML 失败: {e}")
+
+    if epoch == context.page_cache.epoch:
+        context.dom_cache.store(
+            key, epoch, tree, len(page_html),
+            max_mb=_config.get("dom_cache_max_mb", DEFAULT_DOM_CACHE_MB),
+        )
+    return tree
+
+
+def _format_xpath_nodes(results: list, output_type: str, attr_name: str, max_results: int) -> list:
+    """将 XPath 结果格式化为字符串列表（过滤空结果）"""
+    from lxml.etree import tostring as etree_tostring
+
+    items = []
+    for node in results[:max_results]:
+        if isinstance(node, str):
+            items.append(node.strip())
+        elif hasattr(node, 'tag'):
+            if output_type == "text":
+                items.append(node.text_content().strip())
+            elif output_type == "inner_html":
+                inner = (node.text or "") + "".join(
+                    etree_tostring(child, encoding="unicode", method="html")
+                    for child in node
+                )
+                items.append(inner.strip())
+            elif output_type == "outer_html":
+                items.append(etree_tostring(node, encoding="unicode", method="html").strip())
+            elif output_type == "attr":
+                items.append(node.get(attr_name, ""))
+            else:
+                items.append(node.text_content().strip())
+        else:
+            items.append(str(node).strip())
+    return [item for item in items if item]
+
+
 async def xpath_query(context, params: dict) -> dict:
     """通过 XPath 查询页面元素，返回匹配元素的文本或 HTML
 
     参数:
-        xpath: XPath 表达式（必填）
+        xpath: XPath 表达式（与 xpaths 二选一）
+        xpaths: 多个 XPath 表达式列表，共用一次 HTML 获取与解析，逐条返回结果
         output: 输出类型（默认 "text"）
             - "text": 元素的纯文本内容
             - "inner_html": 元素的内部 HTML
@@ -516,6 +1217,9 @@ async def xpath_query(context, params: dict) -> dict:
         max_results: 最大返回数量（默认 20）
         max_length: 单条结果最大显示字符数（默认从 config.json 读取，兜底 500）
         save_path: 结果保存到文件的路径（可选，传入则将完整结果写入文件）
+        fresh: 为 true 时跳过 DOM 缓存，重新获取页面 HTML（默认 False）
+
+    同一页面（期间没有改变页面的操作）的解析结果会被缓存，连续查询无需重复获取和解析。
 
     示例 XPath:
         //h1                          → 所有 h1 标题
@@ -524,12 +1228,12 @@ async def xpath_query(context, params: dict) -> dict:
         //div[@class='content']//p    → content 区域内的段落
         //meta[@name='description']/@content → meta 描述内容
     """
-    from lxml import html as lxml_html
-    from lxml.etree import tostring as etree_tostring
-
-    xpath_expr = params.get("xpath", "")
-    if not xpath_expr:
+    xpaths = params.get("xpaths") or ([params["xpath"]] if params.get("xpath") else [])
+    if isinstance(xpaths, str):
+        xpaths = [xpaths]
+    if not xpaths:
         return {"success": False, "error": "缺少 xpath 参数"}
+    multi = "xpaths" in params
 
     output_type = params.get("output", "text")
     attr_name = params.get("attr_name", "")
@@ -540,90 +1244,104 @@ async def xpath_query(context, params: dict) -> dict:
     if output_type == "attr" and not attr_name:
         return {"success": False, "error": "output='attr' 时需要提供 attr_name 参数"}
 
-    # 获取页面 HTML
-    try:
-        page_html = await context.send_message("getPageHtml", {})
-    except Exception as e:
-        return {"success": False, "error": f"获取页面 HTML 失败: {e}"}
+    # 先校验 XPath 语法，表达式错误时无需请求页面
+    for xpath_expr in xpaths:
+        try:
+            _compile_xpath(xpath_expr, threading.get_ident())
+        except Exception as e:
+            return {"success": False, "error": f"XPath 表达式错误: {xpath_expr}: {e}"}
 
-    # 解析 HTML
+    # 获取并解析页面 HTML（带缓存）
     try:
-        tree = lxml_html.fromstring(page_html)
+        tree = await _page_dom(context, params)
     except Exception as e:
-        return {"success": False, "error": f"解析 HTML 失败: {e}"}
+        return {"success": False, "error": str(e)}
 
     # 执行 XPath
     try:
-        results = tree.xpath(xpath_expr)
-    except Exception as e:
-        return {"success": False, "error": f"XPath 表达式错误: {e}"}
+        queries = await run_cpu(_run_xpaths, tree, xpaths, output_type, attr_name, max_results)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
 
-    if not results:
-        return {"success": True, "data": {"type": "text", "text": f"XPath \"{xpath_expr}\" 未匹配到任何元素", "count": 0}}
+    if not multi:
+        query = queries[0]
+        xpath_expr, total, items = query["xpath"], query["count"], query["items"]
+        if not total:
+            return {"success": True, "data": {"type": "text", "text": f"XPath \"{xpath_expr}\" 未匹配到任何元素", "count": 0}}
+        shown = len(items)
+
+        # 保存到文件（完整内容，不截断）
+        if save_path:
+            try:
+                file_lines = [f"XPath: {xpath_expr}", f"匹配 {total} 个结果（显示 {shown} 个）:", ""]
+                for i, item in enumerate(items):
+                    file_lines.append(f"[{i+1}] {item}")
+                    file_lines.append("")
+                Path(save_path).write_text("\n".join(file_lines), encoding="utf-8")
+            except Exception as e:
+                return {"success": False, "error": f"保存文件失败: {e}"}
+
+        # 保存到文件时只返回摘要，不输出内容
+        if save_path:
+            return {
+                "success": True,
+                "data": {
+                    "type": "text",
+                    "text": f"匹配 {total} 个结果，已保存到: {save_path}",
+                    "count": total,
+                }
+            }
 
-    # 格式化结果
-    items = []
-    for i, node in enumerate(results[:max_results]):
-        if isinstance(node, str):
-            items.append(node.strip())
-        elif hasattr(node, 'tag'):
-            if output_type == "text":
-                items.append(node.text_content().strip())
-            elif output_type == "inner_html":
-                inner = (node.text or "") + "".join(
-                    etree_tostring(child, encoding="unicode", method="html")
-                    for child in node
-                )
-                items.append(inner.strip())
-            elif output_type == "outer_html":
-                items.append(etree_tostring(node, encoding="unicode", method="html").strip())
-            elif output_type == "attr":
-                items.append(node.get(attr_name, ""))
-            else:
-                items.append(node.text_content().strip())
-        else:
-            items.append(str(node).strip())
+        # 构建显示文本（截断）
+        lines = [f"匹配 {total} 个结果（显示 {shown} 个）:"]
+        for i, item in enumerate(items):
+            display = item if len(item) <= max_length else item[:max_length] + "..."
+            lines.append(f"  [{i+1}] {display}")
 
-    # 过滤空结果
-    items = [item for item in items if item]
-    total = len(results)
-    shown = len(items)
+        return {
+            "success": True,
+            "data": {
+                "type": "text",
+                "text": "\n".join(lines),
+                "count": total,
+                "items": items
+            }
+        }
 
-    # 保存到文件（完整内容，不截断）
+    # 多表达式：逐条输出
     if save_path:
         try:
-            file_lines = [f"XPath: {xpath_expr}", f"匹配 {total} 个结果（显示 {shown} 个）:", ""]
-            for i, item in enumerate(items):
-                file_lines.append(f"[{i+1}] {item}")
-                file_lines.append("")
+            file_lines = []
+            for query in queries:
+                file_lines += [f"XPath: {query['xpath']}", f"匹配 {query['count']} 个结果（显示 {len(query['items'])} 个）:", ""]
+                for i, item in enumerate(query["items"]):
+                    file_lines.append(f"[{i+1}] {item}")
+                    file_lines.append("")
             Path(save_path).write_text("\n".join(file_lines), encoding="utf-8")
         except Exception as e:
             return {"success": False, "error": f"保存文件失败: {e}"}
-
-    # 保存到文件时只返回摘要，不输出内容
-    if save_path:
+        summary = ", ".join(f"{q['xpath']}: {q['count']}" for q in queries)
         return {
             "success": True,
             "data": {
                 "type": "text",
-                "text": f"匹配 {total} 个结果，已保存到: {save_path}",
-                "count": total,
+                "text": f"{len(queries)} 个 XPath 查询完成（{summary}），已保存到: {save_path}",
+                "results": [{"xpath": q["xpath"], "count": q["count"]} for q in queries],
             }
         }
 
-    # 构建显示文本（截断）
-    lines = [f"匹配 {total} 个结果（显示 {shown} 个）:"]
-    for i, item in enumerate(items):
-        display = item if len(item) <= max_length else item[:max_length] + "..."
-        lines.append(f"  [{i+1}] {display}")
-
+    lines = []
+    for query in queries:
+        lines.append(f"XPath \"{query['xpath']}\": 匹配 {query['count']} 个结果（显示 {len(query['items'])} 个）")
+        for i, item in enumerate(query["items"]):
+            display = item if len(item) <= max_length else item[:max_length] + "..."
+            lines.append(f"  [{i+1}] {display}")
     return {
         "success": True,
         "data": {
             "type": "text",
             "text": "\n".join(lines),
-            "count": total,
-            "items": items
+            "results": queries,
         }
     }
 
@@ -645,6 +1363,7 @@ TOOLS = {
     "find_and_locate": find_and_locate,
     "get_text": get_text,
     "wait": wait,
+    "wait_for": wait_for,
     "screenshot": screenshot,
     "snapshot": snapshot,
     "get_console_logs": get_console_logs,
@@ -655,3 +1374,45 @@ TOOLS = {
     "close_tab": close_tab,
     "xpath_query": xpath_query,
 }
+
+# 会改变页面状态的操作，执行前使当前标签页的页面缓存失效
+# （switch_tab 不在其中：每个标签页有独立缓存，ref 切换后仍有效）
+MUTATING_TOOLS = {
+    "navigate",
+    "go_back",
+    "go_forward",
+    "click",
+    "hover",
+    "type",
+    "select_option",
+    "drag",
+    "press_key",
+    "wait",
+    "list_tabs",
+    "new_tab",
+    "close_tab",
+}
+
+# 开启预取时，这些操作完成后在后台获取新快照（通常紧接着 find_element / find_and_locate）
+# type/hover/drag 不在其中：之后常继续使用已有 ref，预取会使其失效
+PREFETCH_TOOLS = {
+    "navigate",
+    "go_back",
+    "go_forward",
+    "click",
+    "select_option",
+    "press_key",
+    "new_tab",
+    "close_tab",
+}
+
+# config.json 中的 prefetch_snapshot，为 true 时等同 server.py --prefetch
+PREFETCH_SNAPSHOT = bool(_config.get("prefetch_snapshot", False))
+
+# 标签页管理工具：独占执行，参数中的 tabId 是操作对象而不是执行位置
+TAB_TOOLS = {
+    "list_tabs",
+    "new_tab",
+    "switch_tab",
+    "close_tab",
+}
@@ -20,10 +20,15 @@ while _p != _p.parent:
     _p = _p.parent
 # === 依赖加载结束 ===
 
+import asyncio
 import socket
 import subprocess
 from typing import Optional
 
+from cache import DEFAULT_TTL
+from executor import run_cpu
+from snapshot import diff_snapshots, parse_snapshot
+
 
 def is_port_in_use(port: int) -> bool:
     """检查端口是否被占用"""
@@ -54,7 +59,14 @@ def kill_process_on_port(port: int):
         print(f"释放端口 {port} 失败: {e}", file=sys.stderr)
 
 
-async def capture_aria_snapshot(context, status: str = "", save_path: str = "", max_length: int = 0, inline: bool = False) -> dict:
+async def capture_aria_snapshot(
+    context,
+    status: str = "",
+    save_path: str = "",
+    max_length: int = 0,
+    inline: bool = False,
+    diff: bool = False,
+) -> dict:
     """捕获页面信息，可选保存 ARIA 快照到文件或直接返回
 
     Args:
@@ -63,15 +75,36 @@ async def capture_aria_snapshot(context, status: str = "", save_path: str = "",
         save_path: 快照保存路径。传入路径则获取快照并写入文件
         max_length: 快照最大字符数。0 表示不截断，>0 则截断快照内容
         inline: 为 True 时直接在响应中返回快照内容（受 max_length 截断）
+        diff: 为 True 时只输出相对当前标签页上一份输出快照的增量；
+            没有基准、URL 已变化或增量超过全量一半时仍输出完整快照
     """
-    url = await context.send_message("getUrl")
-    title = await context.send_message("getTitle")
     status_line = f"{status}\n" if status else ""
 
+    # URL、标题、快照合并为一批发送，只付出一次往返延迟
     need_snapshot = save_path or inline
+    epoch = context.page_cache.epoch
+    messages = ["getUrl", "getTitle"]
+    if need_snapshot:
+        messages.append(("browser_snapshot", {}))
+    results = await context.send_batch(messages)
+    url, title = results[0], results[1]
+
     snapshot = ""
+    snapshot_label = "Page Snapshot"
     if need_snapshot:
-        snapshot = await context.send_message("browser_snapshot", {})
+        snapshot = results[2]
+        tree = await run_cpu(parse_snapshot, snapshot, size=len(snapshot), picklable=True)
+        # 新快照会使旧 ref 失效，同步更新页面缓存
+        context.page_cache.store(url, title, snapshot, tree, epoch)
+
+        base = context.snapshot_bases.get(context.active_tab_id)
+        context.snapshot_bases[context.active_tab_id] = (url, tree)
+        if diff and base is not None and base[0] == url:
+            changes = diff_snapshots(base[1], tree)
+            if changes.size() * 2 <= len(tree.nodes):
+                snapshot = changes.to_text()
+                snapshot_label = f"Page Snapshot Diff ({changes.summary()})"
+
         if max_length > 0 and len(snapshot) > max_length:
             snapshot = snapshot[:max_length] + f"\n... (truncated, total {len(snapshot)} chars)"
 
@@ -80,7 +113,7 @@ async def capture_aria_snapshot(context, status: str = "", save_path: str = "",
             f"{status_line}"
             f"- Page URL: {url}\n"
             f"- Page Title: {title}\n"
-            f"- Page Snapshot\n"
+            f"- {snapshot_label}\n"
             f"```yaml\n"
             f"{snapshot}\n"
             f"```"
@@ -92,6 +125,43 @@ async def capture_aria_snapshot(context, status: str = "", save_path: str = "",
         return {"type": "text", "text": f"{status_line}- Page URL: {url}\n- Page Title: {title}\n- Snapshot saved to: {save_path}"}
 
     if inline:
-        return {"type": "text", "text": f"{status_line}- Page URL: {url}\n- Page Title: {title}\n- Page Snapshot\n```yaml\n{snapshot}\n```"}
+        return {"type": "text", "text": f"{status_line}- Page URL: {url}\n- Page Title: {title}\n- {snapshot_label}\n```yaml\n{snapshot}\n```"}
 
     return {"type": "text", "text": f"{status_line}- Page URL: {url}\n- Page Title: {title}"}
+
+
+async def get_page_state(context, fresh: bool = False, ttl: float = DEFAULT_TTL):
+    """获取当前页面状态（URL、标题、快照、节点树），优先使用缓存
+
+    Args:
+        context: 浏览器上下文
+        fresh: 为 True 时跳过缓存，强制重新获取
+        ttl: 缓存有效秒数，0 表示不过期
+    """
+    cache = context.page_cache
+    if not fresh:
+        state = cache.get(ttl)
+        if state is not None:
+            return state
+        # 同一页面版本已有获取在进行（如后台预取），等待它而不是再取一次
+        task = cache.inflight()
+        if task is not None:
+            cache.joins += 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            except Exception:
+                pass
+    task = asyncio.ensure_future(_fetch_page_state(context, cache))
+    cache.track(task)
+    return await task
+
+
+async def _fetch_page_state(context, cache):
+    epoch = cache.epoch
+    url, title, snapshot = await context.send_batch(["getUrl", "getTitle", ("browser_snapshot", {})])
+    snapshot = snapshot if isinstance(snapshot, str) else str(snapshot)
+    tree = await run_cpu(parse_snapshot, snapshot, size=len(snapshot), picklable=True)
+    return cache.store(url, title, snapshot, tree, epoch)